@@ -0,0 +1,150 @@
+"""
+End-to-end latency of the SupabaseClient reads the handlers make,
+against benchmarks/fake_postgrest.py.
+
+    python -m benchmarks.client_latency
+    python -m benchmarks.client_latency --latency 0 0.02 0.08 --contracts 5000
+
+Each call runs with a cold query cache, so the numbers are round trips
+plus (de)serialization, not cache hits. Results go to JSON like
+benchmarks/run.py.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+from benchmarks import datasets
+from benchmarks.fake_postgrest import FakePostgREST
+
+
+def calls(client, contracts: list) -> dict:
+    """
+    name -> async () -> anything, one per handler read path.
+    """
+
+    code = contracts[len(contracts) // 2]["contract_code"]
+    codes = [c["contract_code"] for c in contracts[:300]]
+
+    return {
+        "get_contract_by_code": lambda: client.get_contract_by_code(code),
+        "fetch_active_contracts": client.fetch_active_contracts,
+        "fetch_contract_violations": lambda: client.fetch_contract_violations(code),
+        "fetch_penalties_by_contract_codes": lambda: client.fetch_penalties_by_contract_codes(codes),
+        "fetch_open_violations_by_codes": lambda: client.fetch_open_violations_by_codes(codes),
+        "fetch_all_contracts": client.fetch_all_contracts,
+        "fetch_all_expenses": client.fetch_all_expenses,
+        "calculate_close_previews": lambda: client.calculate_close_previews(
+            contracts[:50], date.today(), False, None, None,
+        ),
+    }
+
+
+async def measure(client, fn, repeat: int) -> dict:
+
+    times = []
+
+    for _ in range(repeat):
+
+        client.cache.clear()
+
+        start = time.perf_counter()
+        await fn()
+        times.append(time.perf_counter() - start)
+
+    return {
+        "best_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+    }
+
+
+async def run(fake: FakePostgREST, latencies, repeat: int) -> list:
+
+    # db/client.py читает SUPABASE_URL при импорте
+    os.environ["SUPABASE_URL"] = fake.url
+    os.environ["SUPABASE_KEY"] = "fake"
+
+    from db.client import SupabaseClient
+
+    client = SupabaseClient(url=fake.url, key="fake")
+    contracts = fake.select("contracts", order="id.asc")
+
+    results = []
+
+    try:
+        for latency in latencies:
+
+            fake.latency = latency
+
+            for name, fn in calls(client, contracts).items():
+
+                fake.requests.clear()
+
+                r = await measure(client, fn, repeat)
+
+                results.append({
+                    "call": name,
+                    "latency_s": latency,
+                    "requests": sum(fake.requests.values()) // repeat,
+                    **r,
+                })
+
+                print(
+                    f"{name:>34}  latency {latency * 1000:5.0f} ms  "
+                    f"requests {results[-1]['requests']:3}  "
+                    f"median {r['median_s'] * 1000:8.1f} ms"
+                )
+    finally:
+        await client.aclose()
+
+    return results
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.client_latency")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0, 0.02, 0.08])
+    parser.add_argument("--contracts", type=int, default=2000)
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="JSON file (default benchmarks/results/latency-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    out = Path(args.out).resolve() if args.out else (
+        ROOT / "benchmarks" / "results" / f"latency-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+
+    with FakePostgREST() as fake:
+
+        fake.seed(**datasets.tables(args.contracts, args.expenses))
+
+        results = asyncio.run(run(fake, args.latency, args.repeat))
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "contracts": args.contracts,
+        "expenses": args.expenses,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("🟢 saved:", out)
+
+
+if __name__ == "__main__":
+    main()
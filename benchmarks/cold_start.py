@@ -0,0 +1,332 @@
+"""
+Cold start of the webhook process: how long `import generate_contract_bot`
+takes, what it pulls in, and how soon a freshly spawned bot answers.
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 10 --no-startup
+    python -m benchmarks.cold_start --baseline before.json --tolerance 0.2
+
+Import: --runs fresh interpreters run the import under `-X importtime`;
+reports the median / best wall time, the modules with the largest self
+time and which of HEAVY_MODULES got loaded (none should, see
+core/lazy.py).
+
+Startup: --startup-runs times a spawned bot (Bot API and Supabase
+stubbed as in benchmarks/webhook_load.py) from spawn until its webhook
+accepts a POST, and until it replies to /start.
+
+Results go to JSON like benchmarks/run.py; with --baseline the run
+exits 1 when a median got slower by more than --tolerance or a heavy
+module is imported again.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+import httpx
+
+from benchmarks import datasets
+from benchmarks.fake_postgrest import FakePostgREST
+from benchmarks.fake_telegram import FakeBotAPI
+from benchmarks.webhook_load import VirtualUser, spawn_bot
+
+
+# the bot process should import none of these at startup
+HEAVY_MODULES = ("docx", "openpyxl", "lxml")
+
+# module-level env lookups of the bot and db/client.py
+IMPORT_ENV = {
+    "BOT_TOKEN": "123456:COLD-START",
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "fake",
+}
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import generate_contract_bot
+took = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": took,
+    "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+    "modules": len(sys.modules),
+}}))
+"""
+
+# import time:   self [us] | cumulative | imported package
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+TOP_MODULES = 15
+
+
+# ======================================================
+# Import
+# ======================================================
+
+def import_once() -> dict:
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=ROOT,
+        env={**os.environ, **IMPORT_ENV},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    result["self_us"] = {}
+
+    for line in proc.stderr.splitlines():
+
+        m = IMPORTTIME_RE.match(line)
+
+        if m:
+            result["self_us"][m.group(4)] = int(m.group(1))
+
+    return result
+
+
+def measure_import(runs: int) -> dict:
+
+    samples = [import_once() for _ in range(runs)]
+
+    times = [s["import_s"] for s in samples]
+
+    per_module = defaultdict(list)
+
+    for s in samples:
+        for module, us in s["self_us"].items():
+            per_module[module].append(us)
+
+    top = sorted(
+        ((module, statistics.median(us)) for module, us in per_module.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:TOP_MODULES]
+
+    return {
+        "runs": runs,
+        "import_s_median": round(statistics.median(times), 6),
+        "import_s_best": round(min(times), 6),
+        "modules": samples[-1]["modules"],
+        "heavy": sorted({m for s in samples for m in s["heavy"]}),
+        "top_self_ms": [{"module": m, "ms": round(us / 1000, 2)} for m, us in top],
+    }
+
+
+# ======================================================
+# Startup of the webhook process
+# ======================================================
+
+def startup_once(port: int, db: FakePostgREST) -> dict:
+
+    user = VirtualUser(1)
+    replied = threading.Event()
+
+    def on_call(chat_id, method, params):
+        if chat_id == user.chat_id and method == "sendMessage":
+            replied.set()
+
+    url = f"http://127.0.0.1:{port}/webhook"
+
+    with FakeBotAPI(on_call=on_call) as api, tempfile.TemporaryDirectory() as workdir:
+
+        with open(os.path.join(workdir, "bot.log"), "w", encoding="utf-8") as log:
+
+            start = time.perf_counter()
+            bot = spawn_bot(port, api, db, workdir, log)
+
+            try:
+                bound = None
+
+                with httpx.Client() as http:
+
+                    while bound is None:
+
+                        if bot.poll() is not None:
+                            raise RuntimeError(f"bot exited with code {bot.returncode}")
+
+                        if time.perf_counter() - start > 60:
+                            raise RuntimeError("bot did not start listening in time")
+
+                        try:
+                            http.post(url, json=user.text("/start"))
+                        except httpx.TransportError:
+                            time.sleep(0.01)
+                            continue
+
+                        bound = time.perf_counter() - start
+
+                if not replied.wait(60):
+                    raise RuntimeError("no reply to /start")
+
+                first_reply = time.perf_counter() - start
+
+            finally:
+                bot.terminate()
+
+                try:
+                    bot.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    bot.kill()
+
+    return {"bound_s": bound, "first_reply_s": first_reply}
+
+
+def measure_startup(runs: int, port: int, contracts: int) -> dict:
+
+    db = FakePostgREST()
+    db.seed(**datasets.tables(contracts, 100))
+
+    with db:
+        samples = [startup_once(port, db) for _ in range(runs)]
+
+    result = {"runs": runs}
+
+    for key in ("bound_s", "first_reply_s"):
+        values = [s[key] for s in samples]
+        result[f"{key}_median"] = round(statistics.median(values), 6)
+        result[f"{key}_best"] = round(min(values), 6)
+
+    return result
+
+
+# ======================================================
+# Baseline comparison
+# ======================================================
+
+COMPARED = (
+    ("import", "import_s_median"),
+    ("startup", "bound_s_median"),
+    ("startup", "first_reply_s_median"),
+)
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+
+    found = []
+
+    for section, metric in COMPARED:
+
+        old = (baseline.get(section) or {}).get(metric)
+        new = (report.get(section) or {}).get(metric)
+
+        if not old or new is None:
+            continue
+
+        ratio = new / old
+
+        if ratio > 1 + tolerance:
+            found.append({
+                "metric": metric,
+                "before": old,
+                "after": new,
+                "ratio": round(ratio, 3),
+            })
+
+    before_heavy = set((baseline.get("import") or {}).get("heavy", ()))
+
+    for module in report["import"]["heavy"]:
+        if module not in before_heavy:
+            found.append({"metric": "heavy_import", "before": None, "after": module, "ratio": None})
+
+    return found
+
+
+# ======================================================
+# CLI
+# ======================================================
+
+def main(argv=None) -> int:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.cold_start")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters for the import timing")
+    parser.add_argument("--startup-runs", type=int, default=3)
+    parser.add_argument("--no-startup", action="store_true", help="only time the import")
+    parser.add_argument("--contracts", type=int, default=2000, help="rows seeded into the fake DB")
+    parser.add_argument("--port", type=int, default=18444, help="webhook port of the spawned bot")
+    parser.add_argument("--out", help="JSON file (default benchmarks/results/cold-start-<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    out = Path(args.out).resolve() if args.out else (
+        ROOT / "benchmarks" / "results" / f"cold-start-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    imp = report["import"] = measure_import(args.runs)
+
+    print(
+        f"import  median {imp['import_s_median'] * 1000:7.1f} ms  "
+        f"best {imp['import_s_best'] * 1000:7.1f} ms  "
+        f"modules {imp['modules']}  heavy {', '.join(imp['heavy']) or '-'}"
+    )
+
+    for row in imp["top_self_ms"]:
+        print(f"    {row['ms']:7.1f} ms  {row['module']}")
+
+    if not args.no_startup:
+
+        try:
+            st = report["startup"] = measure_startup(args.startup_runs, args.port, args.contracts)
+        except RuntimeError as e:
+            print("🔥", e)
+            return 1
+
+        print(
+            f"startup bound  median {st['bound_s_median'] * 1000:7.1f} ms  "
+            f"first reply  median {st['first_reply_s_median'] * 1000:7.1f} ms"
+        )
+
+    status = 0
+
+    if baseline_path:
+
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        report["baseline"] = str(baseline_path)
+        report["regressions"] = regressions(report, baseline, args.tolerance)
+
+        for reg in report["regressions"]:
+            print(f"🔥 REGRESSION {reg['metric']}: {reg['before']} -> {reg['after']} (x{reg['ratio']})")
+
+        status = 1 if report["regressions"] else 0
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("🟢 saved:", out)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
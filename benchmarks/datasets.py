@@ -0,0 +1,257 @@
+import random
+from datetime import date, timedelta
+
+from core.utils import build_contract_code
+
+
+# ======================================================
+# Synthetic rows shaped like the Supabase tables
+# ======================================================
+
+FLATS = [str(n) for n in range(1, 25)]
+
+NAMES = [
+    "Иван Петров",
+    "Anna Bērziņa",
+    "Jānis Kalniņš",
+    "Ольга Смирнова",
+    "Peter Müller",
+    "Līga Ozola",
+]
+
+# коды как у VIOLATION_REASONS в боте
+VIOLATION_TYPES = ["smoking", "noise", "damage", "dirty"]
+
+EXPENSE_CATEGORIES = [
+    "Уборка",
+    "Коммунальные",
+    "Ремонт",
+    "Расходники",
+    "Бельё",
+]
+
+
+def contract_row(
+    rng: random.Random,
+    n: int,
+    first_day: date,
+    taken: set | None = None,
+    days: int = 3 * 365,
+) -> dict:
+    """
+    One contracts row. The code is built like the bot builds it (start
+    date + flat), so two rows with the same start and flat would share
+    it; with `taken` the start is redrawn until (start, flat) is free.
+    """
+
+    flat = rng.choice(FLATS)
+    start = first_day + timedelta(days=rng.randrange(days))
+
+    if taken is not None:
+
+        while (start, flat) in taken:
+            start = first_day + timedelta(days=rng.randrange(days))
+
+        taken.add((start, flat))
+
+    nights = rng.choice([1, 2, 3, 5, 7, 14, 30, 90])
+    end = start + timedelta(days=nights)
+
+    price = rng.randrange(25, 120)
+    closed = rng.random() < 0.7
+    early = closed and rng.random() < 0.1
+
+    actual = end - timedelta(days=rng.randrange(nights)) if early else end
+
+    return {
+        "id": n,
+        "created_at": f"{start.isoformat()}T12:00:00+00:00",
+        "contract_code": build_contract_code(start.strftime("%d.%m.%Y"), flat),
+        "flat_number": flat,
+
+        "client_name": rng.choice(NAMES),
+        "client_id": f"{rng.randrange(10**10, 10**11)}",
+        "client_address": "Rīga, Brīvības iela 1",
+        "client_mail": f"client{n}@example.com",
+        "client_number": f"+371{rng.randrange(10**7, 10**8)}",
+
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "actual_checkout_date": actual.isoformat() if closed else None,
+        "checkout_time": "12:00",
+        "nights": nights,
+
+        "max_people_day": rng.randrange(1, 5),
+        "max_people_night": rng.randrange(1, 5),
+
+        "price_per_day": price,
+        "total_price": price * nights,
+        "deposit": rng.choice([0, 100, 200]),
+
+        "payment_method": rng.choice(["cash", "bank_transfer"]),
+        "invoice_issued": rng.random() < 0.3,
+        "invoice_number": None,
+        "fixed_per_booking": round(rng.uniform(5, 25), 2),
+
+        "is_closed": closed,
+        "early_checkout": early,
+        "early_initiator": "client" if early else None,
+        "early_reason": "Изменились планы" if early else None,
+
+        "refund_unused_amount": 0,
+        "final_refund_amount": 0,
+        "extra_due_amount": 0,
+    }
+
+
+def contracts(count: int, seed: int = 0, first_day: date = date(2024, 1, 1)) -> list:
+    rng = random.Random(seed)
+    taken = set()
+
+    # не больше половины пар (день, квартира) занято — повторные
+    # попытки в contract_row остаются редкими
+    days = max(3 * 365, 2 * count // len(FLATS) + 1)
+
+    return [contract_row(rng, n, first_day, taken, days) for n in range(1, count + 1)]
+
+
+def violations(contract: dict, count: int, seed: int = 0) -> list:
+
+    rng = random.Random(seed)
+
+    return [
+        {
+            "id": n,
+            "contract_code": contract["contract_code"],
+            "flat_number": contract["flat_number"],
+            "violation_type": rng.choice(VIOLATION_TYPES),
+            "amount": rng.choice([20, 50, 100, 150]),
+            "description": "Зафиксировано при осмотре" if rng.random() < 0.5 else None,
+            "resolved": False,
+        }
+        for n in range(1, count + 1)
+    ]
+
+
+def expenses(count: int, seed: int = 0, first_day: date = date(2024, 1, 1)) -> list:
+
+    rng = random.Random(seed)
+
+    rows = [
+        {
+            "id": n,
+            "amount": round(rng.uniform(1, 400), 2),
+            "expense_date": (first_day + timedelta(days=rng.randrange(3 * 365))).isoformat(),
+            "category": rng.choice(EXPENSE_CATEGORIES),
+            "description": rng.choice(EXPENSE_CATEGORIES),
+            "payment_method": rng.choice(["cash", "company"]),
+        }
+        for n in range(1, count + 1)
+    ]
+
+    # как отдаёт fetch_expenses_all: order=expense_date.asc,id.asc
+    rows.sort(key=lambda r: (r["expense_date"], r["id"]))
+
+    return rows
+
+
+def contract_form(contract: dict) -> dict:
+    """
+    context.user_data as it looks when generate_docs runs.
+    """
+
+    start = date.fromisoformat(contract["start_date"])
+    end = date.fromisoformat(contract["end_date"])
+
+    return {
+        "CONTRACT_CODE": contract["contract_code"],
+        "FLAT_NUMBER": contract["flat_number"],
+
+        "CLIENT_NAME": contract["client_name"],
+        "CLIENT_ID": contract["client_id"],
+        "CLIENT_ADDRESS": contract["client_address"],
+        "CLIENT_MAIL": contract["client_mail"],
+        "CLIENT_NUMBER": contract["client_number"],
+
+        "START_DATE": start.strftime("%d.%m.%Y"),
+        "END_DATE": end.strftime("%d.%m.%Y"),
+
+        "MAX_PEOPLE_DAY": str(contract["max_people_day"]),
+        "MAX_PEOPLE_NIGHT": str(contract["max_people_night"]),
+
+        "PRICE_PER_DAY": str(contract["price_per_day"]),
+        "TOTAL_PRICE": str(contract["total_price"]),
+        "DEPOSIT": str(contract["deposit"]),
+
+        "CHECKOUT_TIME": contract["checkout_time"],
+    }
+
+
+def bookings(count: int, seed: int = 0, first_day: date = date(2024, 1, 1)) -> list:
+
+    rng = random.Random(seed)
+    rows = []
+
+    for n in range(1, count + 1):
+
+        start = first_day + timedelta(days=rng.randrange(3 * 365))
+        nights = rng.choice([None, 2, 7, 30])
+        price = rng.randrange(25, 120)
+
+        rows.append({
+            "id": n,
+            "flat_number": rng.choice(FLATS),
+            "client_name": rng.choice(NAMES),
+            "client_number": f"+371{rng.randrange(10**7, 10**8)}",
+            "price_per_day": price,
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=nights)).isoformat() if nights else None,
+            "nights": nights,
+            "total_price": nights * price if nights else None,
+            "status": rng.choice(["active", "active", "cancelled"]),
+        })
+
+    return rows
+
+
+def fixed_expenses() -> list:
+
+    items = [("Мыло", 2, 1.5), ("Туалетная бумага", 4, 0.6), ("Уборка", 1, 8.0)]
+
+    return [
+        {
+            "id": n,
+            "item_name": name,
+            "quantity": quantity,
+            "unit_price": price,
+            "total_price": round(quantity * price, 3),
+        }
+        for n, (name, quantity, price) in enumerate(items, start=1)
+    ]
+
+
+def tables(contract_count: int, expense_count: int = 0, seed: int = 0) -> dict:
+    """
+    Every table the bot reads, for benchmarks/fake_postgrest.py: a
+    tenth of the contracts have a violation or two.
+    """
+
+    rows = contracts(contract_count, seed)
+    rng = random.Random(seed)
+
+    found = []
+
+    for contract in rows:
+        if rng.random() < 0.1:
+            found.extend(violations(contract, rng.randrange(1, 3), rng.randrange(10**6)))
+
+    for n, row in enumerate(found, start=1):
+        row["id"] = n
+
+    return {
+        "contracts": rows,
+        "violations": found,
+        "bookings": bookings(contract_count // 10, seed),
+        "expenses": expenses(expense_count, seed),
+        "fixed_expenses": fixed_expenses(),
+    }
@@ -0,0 +1,632 @@
+"""
+In-process stand-in for the Supabase PostgREST API.
+
+    with FakePostgREST(latency=0.05) as fake:
+        fake.seed(contracts=datasets.contracts(1000))
+        client = SupabaseClient(url=fake.url, key="fake")
+
+db/client.py reads SUPABASE_URL / SUPABASE_KEY when it is imported, so
+anything that uses the `supabase` singleton has to start the server
+and set the environment first:
+
+    fake = FakePostgREST().start()
+    os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"] = fake.url, "fake"
+    import db.client
+
+or run it standalone and point the bot at it:
+
+    python -m benchmarks.fake_postgrest --port 54321 --contracts 1000 --latency 0.05
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=fake python generate_contract_bot.py
+
+Serves contracts, violations, bookings, expenses and fixed_expenses from
+memory, with the parts of PostgREST db/client.py relies on: eq / neq /
+gt / gte / lt / lte / in / is filters, or=(...) / and(...) trees,
+order, select, limit / offset and Range paging, column defaults on
+insert (DEFAULTS), Prefer: return=representation, and the
+contract_penalties RPC. Other RPCs answer 404 PGRST202 like an
+undeployed function, so the client takes its fallback path
+(e.g. close_contract -> PATCH).
+
+Every request waits `latency` (+ up to `jitter`) seconds before being
+answered; both can be changed while the server runs.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+TABLES = ("contracts", "violations", "bookings", "expenses", "fixed_expenses")
+
+# column defaults of the Supabase schema the bot relies on: it inserts
+# violations without `resolved` and reads them back with resolved=eq.false
+DEFAULTS = {
+    "contracts": {"is_closed": False},
+    "violations": {"resolved": False},
+}
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+}
+
+# params that are not column filters
+RESERVED = {"select", "order", "limit", "offset"}
+
+LOGIC = {"or": any, "and": all}
+
+IN_VALUE_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|([^,]+)')
+
+
+class PostgRESTError(Exception):
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+# ======================================================
+# Query evaluation
+# ======================================================
+
+def coerce(raw: str, sample):
+    """
+    Filter operand as the type of the column value it is compared to.
+    """
+
+    if raw == "null":
+        return None
+
+    if isinstance(sample, bool):
+        return raw == "true"
+
+    if isinstance(sample, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+
+    return raw
+
+
+def parse_in(operand: str) -> list:
+
+    if not (operand.startswith("(") and operand.endswith(")")):
+        raise PostgRESTError(400, "PGRST100", f"bad in operand: {operand}")
+
+    return [
+        quoted.replace('\\"', '"') if quoted else bare
+        for quoted, bare in IN_VALUE_RE.findall(operand[1:-1])
+    ]
+
+
+def unquote(operand: str) -> str:
+
+    if len(operand) > 1 and operand[0] == operand[-1] == '"':
+        return operand[1:-1].replace('\\"', '"')
+
+    return operand
+
+
+def split_terms(inner: str) -> list:
+    """
+    Top-level terms of `a.eq.1,and(b.eq.2,c.eq.3)`: commas inside
+    parentheses or quotes don't split.
+    """
+
+    terms, depth, quoted, start = [], 0, False, 0
+
+    for i, ch in enumerate(inner):
+
+        if ch == '"' and inner[i - 1:i] != "\\":
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            terms.append(inner[start:i])
+            start = i + 1
+
+    terms.append(inner[start:])
+
+    return terms
+
+
+def logic_predicate(kind: str, operand: str):
+    """
+    `or=(...)` / `and=(...)`, and their nested `or(...)` / `and(...)`
+    terms, as a row -> bool test.
+    """
+
+    if not (operand.startswith("(") and operand.endswith(")")):
+        raise PostgRESTError(400, "PGRST100", f"bad {kind} operand: {operand}")
+
+    tests = []
+
+    for term in split_terms(operand[1:-1]):
+
+        name, paren, rest = term.partition("(")
+
+        if paren and name in LOGIC:
+            tests.append(logic_predicate(name, paren + rest))
+        else:
+            column, _, expr = term.partition(".")
+            tests.append(predicate(column, expr))
+
+    combine = LOGIC[kind]
+
+    return lambda row: combine(test(row) for test in tests)
+
+
+def predicate(column: str, expr: str):
+    """
+    `column=expr` as a row -> bool test, parsed once per request.
+    """
+
+    if column in LOGIC:
+        return logic_predicate(column, expr)
+
+    op, _, operand = expr.partition(".")
+
+    negate = op == "not"
+
+    if negate:
+        op, _, operand = operand.partition(".")
+
+    if op != "in":
+        operand = unquote(operand)
+
+    if op == "in":
+        wanted = parse_in(operand)
+
+        def test(value):
+            return value is not None and any(value == coerce(w, value) for w in wanted)
+
+    elif op == "is":
+        expected = {"null": None, "true": True, "false": False}.get(operand)
+
+        def test(value):
+            return value is expected
+
+    elif op in OPERATORS:
+        compare = OPERATORS[op]
+
+        def test(value):
+            try:
+                return compare(value, coerce(operand, value))
+            except TypeError:
+                return False
+
+    else:
+        raise PostgRESTError(400, "PGRST100", f"unsupported operator: {op}")
+
+    return lambda row: test(row.get(column)) != negate
+
+
+def apply_filters(rows: list, filters) -> list:
+
+    tests = [predicate(column, expr) for column, expr in filters]
+
+    return [row for row in rows if all(test(row) for test in tests)]
+
+
+def null_last(value):
+    return (True, 0) if value is None else (False, value)
+
+
+def apply_order(rows: list, order: str) -> list:
+
+    rows = list(rows)
+
+    # stable sorts from the last key to the first
+    for term in reversed(order.split(",")):
+
+        column, _, direction = term.partition(".")
+        desc = direction.startswith("desc")
+
+        # nulls last for asc, first for desc (PostgREST default)
+        rows.sort(key=lambda r: null_last(r.get(column)), reverse=desc)
+
+    return rows
+
+
+def apply_select(rows: list, select: str | None) -> list:
+
+    if not select or select == "*":
+        return [dict(row) for row in rows]
+
+    columns = [c.strip() for c in select.split(",")]
+
+    return [{c: row.get(c) for c in columns} for row in rows]
+
+
+def parse_range(header: str | None) -> tuple[int, int | None]:
+
+    if not header:
+        return 0, None
+
+    lo, _, hi = header.partition("-")
+
+    return int(lo), int(hi) + 1 if hi else None
+
+
+# ======================================================
+# Server
+# ======================================================
+
+class LocalServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    # the default backlog of 5 drops connects under load and the client
+    # only retries after a second, which reads as fake latency
+    request_queue_size = 128
+
+
+class FakePostgREST:
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rpcs: dict | None = None,
+        max_rows: int | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+
+        # db-max-rows of the real API: a GET never returns more
+        self.max_rows = max_rows
+
+        self.tables = {name: [] for name in TABLES}
+        self._next_id = {name: 1 for name in TABLES}
+        self._lock = threading.Lock()
+
+        # name -> callable(fake, body) -> JSON-able result
+        self.rpcs = {"contract_penalties": rpc_contract_penalties}
+        self.rpcs.update(rpcs or {})
+
+        # (method, path) -> count
+        self.requests = Counter()
+
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # --------------------------------------------------
+
+    def start(self):
+
+        self._server = LocalServer((self.host, self.port), _handler(self))
+        self.port = self._server.server_address[1]
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="fake-postgrest",
+            daemon=True,
+        )
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --------------------------------------------------
+
+    def seed(self, **tables):
+        """
+        seed(contracts=[...], violations=[...]) appends rows as given;
+        rows without an id get the next one.
+        """
+
+        for name, rows in tables.items():
+            self.insert(name, rows)
+
+    def insert(self, table: str, rows: list) -> list:
+
+        self._table(table)
+
+        now = datetime.now(timezone.utc).isoformat()
+        stored = []
+
+        with self._lock:
+
+            for row in rows:
+
+                row = dict(row)
+
+                if row.get("id") is None:
+                    row["id"] = self._next_id[table]
+
+                self._next_id[table] = max(self._next_id[table], row["id"] + 1)
+                row.setdefault("created_at", now)
+
+                for column, value in DEFAULTS.get(table, {}).items():
+                    row.setdefault(column, value)
+
+                self.tables[table].append(row)
+                stored.append(row)
+
+        return stored
+
+    def select(self, table: str, filters=(), order=None, select=None, start=0, stop=None) -> list:
+
+        with self._lock:
+            rows = apply_filters(self._table(table), filters)
+
+        if order:
+            rows = apply_order(rows, order)
+
+        return apply_select(rows[start:stop], select)
+
+    def update(self, table: str, filters, values: dict) -> list:
+
+        with self._lock:
+
+            rows = apply_filters(self._table(table), filters)
+
+            for row in rows:
+                row.update(values)
+
+            return [dict(row) for row in rows]
+
+    def delete(self, table: str, filters) -> list:
+
+        with self._lock:
+
+            rows = self._table(table)
+            doomed = apply_filters(rows, filters)
+            gone = {id(row) for row in doomed}
+
+            self.tables[table] = [row for row in rows if id(row) not in gone]
+
+            return doomed
+
+    def _table(self, name: str) -> list:
+
+        if name not in self.tables:
+            raise PostgRESTError(404, "PGRST205", f"Could not find the table 'public.{name}'")
+
+        return self.tables[name]
+
+    def wait(self):
+
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+def rpc_contract_penalties(fake: FakePostgREST, body: dict) -> list:
+    """
+    db/sql/contract_penalties.sql
+    """
+
+    codes = body.get("codes")
+    totals = Counter()
+
+    for v in fake.select("violations"):
+        if codes is None or v["contract_code"] in codes:
+            totals[v["contract_code"]] += int(v["amount"])
+
+    return [{"contract_code": code, "total": total} for code, total in totals.items()]
+
+
+# ======================================================
+# HTTP
+# ======================================================
+
+def _handler(fake: FakePostgREST):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        # keep-alive, like the real API behind httpx
+        protocol_version = "HTTP/1.1"
+
+        # headers and body go out in two writes; with Nagle on, the
+        # body waits for a delayed ACK (~40 ms per request)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self._dispatch(self._get)
+
+        def do_POST(self):
+            self._dispatch(self._post)
+
+        def do_PATCH(self):
+            self._dispatch(self._patch)
+
+        def do_DELETE(self):
+            self._dispatch(self._delete)
+
+        # --------------------------------------------------
+
+        def _dispatch(self, method):
+
+            parts = urlsplit(self.path)
+            path = parts.path.removeprefix("/rest/v1")
+            params = parse_qsl(parts.query, keep_blank_values=True)
+
+            body = self._body()
+
+            fake.requests[(self.command, path)] += 1
+            fake.wait()
+
+            try:
+                status, payload, headers = method(path.strip("/"), params, body)
+            except PostgRESTError as e:
+                status, payload, headers = e.status, {
+                    "code": e.code,
+                    "message": e.message,
+                    "details": None,
+                    "hint": None,
+                }, {}
+
+            self._reply(status, payload, headers)
+
+        def _body(self):
+
+            length = int(self.headers.get("Content-Length") or 0)
+
+            if not length:
+                return None
+
+            return json.loads(self.rfile.read(length))
+
+        def _reply(self, status: int, payload, headers: dict):
+
+            data = b"" if payload is None else json.dumps(payload, default=str).encode()
+
+            self.send_response(status)
+
+            for name, value in headers.items():
+                self.send_header(name, value)
+
+            if payload is not None:
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _wants_rows(self) -> bool:
+            return "return=representation" in (self.headers.get("Prefer") or "")
+
+        # --------------------------------------------------
+
+        def _get(self, table, params, body):
+
+            query = dict(p for p in params if p[0] in RESERVED)
+            filters = [p for p in params if p[0] not in RESERVED]
+
+            start, stop = parse_range(self.headers.get("Range"))
+
+            if "offset" in query:
+                start = int(query["offset"])
+
+            if "limit" in query:
+                stop = start + int(query["limit"])
+
+            if fake.max_rows is not None:
+                stop = min(stop if stop is not None else start + fake.max_rows, start + fake.max_rows)
+
+            rows = fake.select(
+                table,
+                filters,
+                order=query.get("order"),
+                select=query.get("select"),
+                start=start,
+                stop=stop,
+            )
+
+            end = f"{start}-{start + len(rows) - 1}" if rows else "*"
+
+            return 200, rows, {"Content-Range": f"{end}/*"}
+
+        def _post(self, table, params, body):
+
+            if table.startswith("rpc/"):
+
+                name = table.removeprefix("rpc/")
+                rpc = fake.rpcs.get(name)
+
+                if rpc is None:
+                    raise PostgRESTError(
+                        404,
+                        "PGRST202",
+                        f"Could not find the function public.{name} in the schema cache",
+                    )
+
+                return 200, rpc(fake, body or {}), {}
+
+            rows = fake.insert(table, body if isinstance(body, list) else [body])
+
+            return 201, rows if self._wants_rows() else None, {}
+
+        def _patch(self, table, params, body):
+
+            rows = fake.update(table, params, body or {})
+
+            if self._wants_rows():
+                return 200, rows, {}
+
+            return 204, None, {}
+
+        def _delete(self, table, params, body):
+            fake.delete(table, params)
+            return 204, None, {}
+
+    return Handler
+
+
+# ======================================================
+# CLI
+# ======================================================
+
+def main(argv=None):
+
+    from benchmarks import datasets
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_postgrest")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds")
+    parser.add_argument("--max-rows", type=int, help="cap on rows per GET, like db-max-rows")
+    parser.add_argument("--contracts", type=int, default=0, help="synthetic contracts to seed")
+    parser.add_argument("--expenses", type=int, default=0, help="synthetic expenses to seed")
+    args = parser.parse_args(argv)
+
+    fake = FakePostgREST(args.host, args.port, args.latency, args.jitter, max_rows=args.max_rows)
+    fake.seed(**datasets.tables(args.contracts, args.expenses))
+    fake.start()
+
+    print("🟢 fake PostgREST on", fake.url)
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Stub of the Telegram Bot API for benchmarks/webhook_load.py.
+
+Answers every method the bot calls with a plausible result, so python-
+telegram-bot is happy, and reports each call that targets a chat to
+`on_call(chat_id, method, params)`. The bot is pointed at it with
+TELEGRAM_API_URL (generate_contract_bot.py).
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+
+from benchmarks.fake_postgrest import LocalServer
+
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Load test",
+    "username": "load_test_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+# methods that return a Message
+MESSAGE_METHODS = {
+    "sendMessage",
+    "sendDocument",
+    "editMessageText",
+    "editMessageReplyMarkup",
+}
+
+# multipart field of a sendDocument upload
+FORM_FIELD_RE = re.compile(rb'name="([^"]+)"(?:; filename="[^"]*")?\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', re.S)
+
+
+def parse_form(body: bytes) -> dict:
+
+    fields = {}
+
+    for name, value in FORM_FIELD_RE.findall(body):
+        name = name.decode()
+
+        # содержимое файла не нужно, только его размер
+        if name in ("document", "photo"):
+            fields[name] = len(value)
+        else:
+            fields[name] = value.decode(errors="replace")
+
+    return fields
+
+
+class FakeBotAPI:
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, on_call=None):
+        self.host = host
+        self.port = port
+        self.on_call = on_call
+
+        self.requests = Counter()
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+
+        self.webhook_set = threading.Event()
+
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+
+        self._server = LocalServer((self.host, self.port), _handler(self))
+        self.port = self._server.server_address[1]
+
+        threading.Thread(
+            target=self._server.serve_forever,
+            name="fake-bot-api",
+            daemon=True,
+        ).start()
+
+        return self
+
+    def stop(self):
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --------------------------------------------------
+
+    def call(self, method: str, params: dict):
+
+        self.requests[method] += 1
+
+        if method == "setWebhook":
+            self.webhook_set.set()
+
+        chat_id = params.get("chat_id")
+
+        if chat_id is not None and self.on_call is not None:
+            self.on_call(int(chat_id), method, params)
+
+        if method == "getMe":
+            return BOT_USER
+
+        if method in MESSAGE_METHODS:
+            return self.message(method, params)
+
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+
+        return True
+
+    def message(self, method: str, params: dict) -> dict:
+
+        with self._lock:
+            message_id = int(params.get("message_id") or next(self._ids))
+            file_n = next(self._ids)
+
+        msg = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "from": BOT_USER,
+        }
+
+        if method == "sendDocument":
+
+            # повторная отправка по file_id приходит строкой
+            file_id = params["document"] if isinstance(params.get("document"), str) else f"doc-{file_n}"
+
+            msg["document"] = {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_name": params.get("filename") or "report",
+            }
+        else:
+            msg["text"] = params.get("text", "")
+
+        return msg
+
+
+def _handler(api: FakeBotAPI):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self._dispatch()
+
+        def do_GET(self):
+            self._dispatch()
+
+        def _dispatch(self):
+
+            # /bot<token>/<method>
+            method = self.path.rsplit("/", 1)[-1].split("?", 1)[0]
+
+            result = api.call(method, self._params())
+
+            data = json.dumps({"ok": True, "result": result}).encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _params(self) -> dict:
+
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+
+            kind = self.headers.get("Content-Type") or ""
+
+            if kind.startswith("application/json"):
+                return json.loads(body or b"{}")
+
+            if kind.startswith("multipart/form-data"):
+                return parse_form(body)
+
+            return dict(parse_qsl(body.decode()))
+
+    return Handler
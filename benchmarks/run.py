@@ -0,0 +1,288 @@
+"""
+Times the document/report builders on synthetic data.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 10 1000 --repeat 5
+    python -m benchmarks.run --only finance_load finance_apply --out before.json
+    python -m benchmarks.run --baseline before.json --tolerance 0.2
+
+Runs offline against templates/*.docx. Every case reports wall time
+(best and median of --repeat runs, plus the first cold call), peak
+Python heap (tracemalloc, in a separate run so it doesn't skew the
+timings) and output size. Results go to JSON; with --baseline the run
+exits 1 when a case got slower or bigger by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+from benchmarks import datasets
+from core.checkout_act import build_checkout_act
+from core.constants import CHECKOUT_ACT_TEMPLATE
+from core.documents import generate_docs
+from reports.excel import build_stats_excel
+from reports.expenses import build_expenses_report
+from reports.finance import write_finance_report
+from reports.finance_ledger import FinanceLedger
+
+
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000]
+
+# строк в таблице нарушений акта выезда
+VIOLATIONS_PER_ACT = [0, 5, 50]
+
+
+# ======================================================
+# Finance: the path the bot takes (FinanceLedger)
+# ======================================================
+
+def finance_load(rows, today: date):
+    """
+    First report after a start: full ledger load, digest, xlsx.
+    """
+
+    ledger = FinanceLedger()
+    ledger.load(rows, today)
+    ledger.digest(today)
+
+    return write_finance_report(ledger.snapshot(today))
+
+
+def finance_apply(ledger: FinanceLedger, row: dict, today: date):
+    """
+    Report after one contract changed: apply() + rebuilding the months
+    it touches, digest, xlsx.
+    """
+
+    ledger.apply(row)
+    ledger.digest(today)
+
+    return write_finance_report(ledger.snapshot(today))
+
+
+def closed_early(row: dict) -> dict:
+
+    start = date.fromisoformat(row["start_date"])
+    nights = row["nights"]
+
+    return {
+        **row,
+        "is_closed": True,
+        "early_checkout": True,
+        "actual_checkout_date": (start + timedelta(days=(nights + 1) // 2)).isoformat(),
+    }
+
+
+# ======================================================
+# Cases
+# ======================================================
+
+def cases(sizes):
+    """
+    Yields (builder, size, fn, args). `size` is the number of rows the
+    builder is given (contracts, expenses or violations on the act).
+    """
+
+    contract = datasets.contracts(1, seed=1)[0]
+    form = datasets.contract_form(contract)
+
+    yield "generate_docs", 1, generate_docs, (form,)
+
+    for count in VIOLATIONS_PER_ACT:
+        yield "checkout_act", count, build_checkout_act, (
+            CHECKOUT_ACT_TEMPLATE,
+            f"checkout_act_{contract['contract_code']}.docx",
+            contract,
+            datasets.violations(contract, count),
+        )
+
+    for size in sizes:
+
+        rows = datasets.contracts(size)
+
+        yield "stats", size, build_stats_excel, (rows,)
+
+        today = date.today()
+        yield "finance_load", size, finance_load, (rows, today)
+
+        # тёплый ledger, как в боте после первого отчёта; каждый прогон
+        # заново применяет одну и ту же закрытую досрочно бронь
+        ledger = FinanceLedger()
+        ledger.load(rows, today)
+        ledger.snapshot(today)
+
+        changed = closed_early(rows[len(rows) // 2])
+        yield "finance_apply", size, finance_apply, (ledger, changed, today)
+
+        yield "expenses", size, build_expenses_report, (datasets.expenses(size),)
+
+
+def output_size(out) -> int:
+
+    # generate_docs отдаёт список (договор + акт)
+    if isinstance(out, list):
+        return sum(len(f.content) for f in out)
+
+    return len(out.content)
+
+
+def measure(fn, args, repeat: int) -> dict:
+
+    start = time.perf_counter()
+    out = fn(*args)
+    cold = time.perf_counter() - start
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "cold_s": round(cold, 6),
+        "best_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "peak_bytes": peak,
+        "output_bytes": output_size(out),
+    }
+
+
+# ======================================================
+# Baseline comparison
+# ======================================================
+
+COMPARED = ("median_s", "peak_bytes", "output_bytes")
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+
+    before = {(r["builder"], r["size"]): r for r in baseline}
+
+    found = []
+
+    for r in results:
+
+        old = before.get((r["builder"], r["size"]))
+
+        if old is None:
+            continue
+
+        for metric in COMPARED:
+
+            if not old.get(metric):
+                continue
+
+            ratio = r[metric] / old[metric]
+
+            if ratio > 1 + tolerance:
+                found.append({
+                    "builder": r["builder"],
+                    "size": r["size"],
+                    "metric": metric,
+                    "before": old[metric],
+                    "after": r[metric],
+                    "ratio": round(ratio, 3),
+                })
+
+    return found
+
+
+# ======================================================
+# CLI
+# ======================================================
+
+def main(argv=None) -> int:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="builders to run (generate_docs, checkout_act, stats, finance_load, finance_apply, expenses)")
+    parser.add_argument("--out", help="JSON file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    out = Path(args.out).resolve() if args.out else (
+        ROOT / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    # шаблоны в core/constants.py заданы относительно корня репозитория
+    os.chdir(ROOT)
+
+    results = []
+
+    for builder, size, fn, fn_args in cases(args.sizes):
+
+        if args.only and builder not in args.only:
+            continue
+
+        r = {"builder": builder, "size": size, **measure(fn, fn_args, args.repeat)}
+        results.append(r)
+
+        print(
+            f"{builder:>14} {size:>7}  "
+            f"median {r['median_s'] * 1000:9.1f} ms  "
+            f"peak {r['peak_bytes'] / 2**20:7.1f} MiB  "
+            f"out {r['output_bytes'] / 1024:8.1f} KiB"
+        )
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    status = 0
+
+    if baseline_path:
+
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+        report["baseline"] = str(baseline_path)
+        report["regressions"] = regressions(results, baseline, args.tolerance)
+
+        for reg in report["regressions"]:
+            print(
+                f"🔥 REGRESSION {reg['builder']} {reg['size']} {reg['metric']}: "
+                f"{reg['before']} -> {reg['after']} (x{reg['ratio']})"
+            )
+
+        status = 1 if report["regressions"] else 0
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("🟢 saved:", out)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,537 @@
+"""
+Load test of the webhook: virtual users replay menu taps and the
+contract form against a running bot, with the Telegram Bot API and
+Supabase stubbed.
+
+    python -m benchmarks.webhook_load
+    python -m benchmarks.webhook_load --users 20 --duration 60 --scenarios stats
+    python -m benchmarks.webhook_load --db-latency 0.05 --think 0.5
+
+By default the bot is started as a subprocess wired to
+benchmarks/fake_telegram.py (TELEGRAM_API_URL) and
+benchmarks/fake_postgrest.py (SUPABASE_URL). To load a bot you started
+yourself, give it those URLs and run with --bot-url (plus --api-port /
+--db-port to put the stubs where the bot expects them).
+
+Every user has its own chat and sends the next update only after the
+previous one was answered. A step's latency runs from the webhook POST
+to the bot's last reply for it (sendMessage / editMessageText /
+sendDocument to that chat), so it includes the time the update waited
+in the bot's queue. Per step: count, errors, p50/p95/p99 and
+throughput; results go to JSON like benchmarks/run.py.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(ROOT))
+
+import httpx
+
+from benchmarks import datasets
+from benchmarks.fake_postgrest import FakePostgREST
+from benchmarks.fake_telegram import FakeBotAPI
+from core.constants import ADMIN_USERNAMES, FIELDS
+
+
+# финальный ответ с этим префиксом — ошибка обработчика
+ERROR_PREFIX = "⚠️"
+
+MAIN_MENU = ("Главное меню:", ERROR_PREFIX)
+
+
+# ======================================================
+# Synthetic updates
+# ======================================================
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+class VirtualUser:
+    """
+    One admin in a private chat; builds the Update JSON Telegram would
+    post for their messages and button taps.
+    """
+
+    def __init__(self, n: int):
+        self.chat_id = 500_000 + n
+        self.user = {
+            "id": self.chat_id,
+            "is_bot": False,
+            "first_name": f"Load {n}",
+            "username": next(iter(ADMIN_USERNAMES)),
+            "language_code": "ru",
+        }
+
+    def _message(self, text: str) -> dict:
+        return {
+            "message_id": next(_message_ids),
+            "date": int(time.time()),
+            "chat": {"id": self.chat_id, "type": "private"},
+            "from": self.user,
+            "text": text,
+        }
+
+    def text(self, text: str) -> dict:
+
+        message = self._message(text)
+
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text.split()[0])},
+            ]
+
+        return {"update_id": next(_update_ids), "message": message}
+
+    def tap(self, data: str) -> dict:
+
+        # кнопка под последним сообщением бота
+        message = self._message("…")
+        message["from"] = {"id": 1, "is_bot": True, "first_name": "bot"}
+
+        return {
+            "update_id": next(_update_ids),
+            "callback_query": {
+                "id": str(next(_update_ids)),
+                "from": self.user,
+                "chat_instance": str(self.chat_id),
+                "message": message,
+                "data": data,
+            },
+        }
+
+
+@dataclass
+class Step:
+    """
+    `until`: number of replies the handler sends, or text prefix(es) of
+    its last reply when that number varies (reports may first say
+    "Формирую…").
+    """
+
+    label: str
+    kind: str               # "text" | "tap"
+    value: str
+    until: int | str | tuple = 1
+
+    def update(self, user: VirtualUser) -> dict:
+        return user.text(self.value) if self.kind == "text" else user.tap(self.value)
+
+
+START = Step("/start", "text", "/start", "👋")
+
+
+def stats_scenario() -> list:
+    return [
+        START,
+        Step("MENU_STATS_MENU", "tap", "MENU_STATS_MENU"),
+        Step("STATS_GENERAL", "tap", "STATS_GENERAL", MAIN_MENU),
+        Step("MENU_STATS_MENU", "tap", "MENU_STATS_MENU"),
+        Step("STATS_FINANCE", "tap", "STATS_FINANCE", MAIN_MENU),
+        Step("MENU_STATS_MENU", "tap", "MENU_STATS_MENU"),
+        Step("STATS_EXPENSES", "tap", "STATS_EXPENSES", MAIN_MENU),
+        Step("MENU_ACTIVE", "tap", "MENU_ACTIVE", MAIN_MENU),
+    ]
+
+
+CONTRACT_ANSWERS = {
+    "FLAT_NUMBER": "12",
+    "CLIENT_NAME": "Load Test",
+    "CLIENT_ID": "010101-12345",
+    "CLIENT_ADDRESS": "Rīga, Brīvības iela 1",
+    "CLIENT_MAIL": "load@example.com",
+    "CLIENT_NUMBER": "+37120000000",
+    "MAX_PEOPLE_DAY": "2",
+    "MAX_PEOPLE_NIGHT": "2",
+    "PRICE_PER_DAY": "40",
+    "DEPOSIT": "100",
+}
+
+
+def contract_scenario() -> list:
+
+    start = date.today() + timedelta(days=1)
+    end = start + timedelta(days=3)
+
+    steps = [START, Step("START_FLOW", "tap", "START_FLOW")]
+
+    for field in FIELDS:
+
+        if field == "START_DATE":
+            steps.append(Step("DATE:start", "tap", f"DATE:{start.isoformat()}"))
+        elif field == "END_DATE":
+            steps.append(Step("DATE:end", "tap", f"DATE:{end.isoformat()}"))
+        elif field == "CHECKOUT_TIME":
+            steps.append(Step("CHECKOUT", "tap", "CHECKOUT:12:00"))
+        else:
+            # после цены бот отдельно пишет расчёт суммы
+            replies = 2 if field == "PRICE_PER_DAY" else 1
+            steps.append(Step(f"FIELDS:{field}", "text", CONTRACT_ANSWERS[field], replies))
+
+    steps += [
+        Step("PAY_CASH", "tap", "PAY_CASH", ("📄", ERROR_PREFIX)),
+        Step("SAVE_DB", "tap", "SAVE_DB", MAIN_MENU),
+    ]
+
+    return steps
+
+
+SCENARIOS = {
+    "stats": stats_scenario,
+    "contract": contract_scenario,
+}
+
+
+# ======================================================
+# Driver
+# ======================================================
+
+def percentile(values: list, q: float) -> float:
+
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+
+    return ordered[rank]
+
+
+class LoadTest:
+
+    def __init__(self, webhook_url: str, timeout: float, think: float):
+        self.webhook_url = webhook_url
+        self.timeout = timeout
+        self.think = think
+
+        self.loop = None
+        self.http = None
+
+        self._inbox = {}        # chat_id -> asyncio.Queue of (t, method, text)
+
+        self.samples = {}       # label -> [seconds]
+        self.errors = {}        # label -> count
+        self.late = 0           # replies that came after their step finished
+
+        self.recording = False
+
+    # вызывается из потока fake_telegram
+    def on_call(self, chat_id: int, method: str, params: dict):
+
+        reply = (time.perf_counter(), method, params.get("text") or "")
+
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, chat_id, reply)
+        except (AttributeError, RuntimeError):
+            # до запуска или после остановки цикла
+            pass
+
+    def _deliver(self, chat_id: int, reply):
+        self._queue(chat_id).put_nowait(reply)
+
+    def _queue(self, chat_id: int) -> asyncio.Queue:
+        return self._inbox.setdefault(chat_id, asyncio.Queue())
+
+    # --------------------------------------------------
+
+    async def step(self, user: VirtualUser, step: Step):
+
+        inbox = self._queue(user.chat_id)
+
+        while not inbox.empty():
+            inbox.get_nowait()
+            self.late += self.recording
+
+        started = time.perf_counter()
+        ok = True
+
+        try:
+            r = await self.http.post(self.webhook_url, json=step.update(user))
+            r.raise_for_status()
+
+            replies = 0
+            deadline = started + self.timeout
+
+            while True:
+
+                at, method, text = await asyncio.wait_for(
+                    inbox.get(),
+                    max(0.0, deadline - time.perf_counter()),
+                )
+                replies += 1
+
+                if isinstance(step.until, int):
+                    if replies >= step.until:
+                        break
+                elif text.startswith(step.until):
+                    ok = not text.startswith(ERROR_PREFIX)
+                    break
+
+            elapsed = at - started
+
+        except (asyncio.TimeoutError, httpx.HTTPError):
+            ok = False
+            elapsed = time.perf_counter() - started
+
+        if self.recording:
+            if ok:
+                self.samples.setdefault(step.label, []).append(elapsed)
+            else:
+                self.errors[step.label] = self.errors.get(step.label, 0) + 1
+
+        return ok
+
+    async def scenario(self, user: VirtualUser, steps: list):
+
+        for step in steps:
+
+            if not await self.step(user, step):
+                # разговор сбился — следующий сценарий начнётся с /start
+                return
+
+            if self.think:
+                await asyncio.sleep(self.think)
+
+    async def user_loop(self, user: VirtualUser, names: list, until: float):
+
+        for name in itertools.cycle(names):
+
+            if time.perf_counter() >= until:
+                return
+
+            await self.scenario(user, SCENARIOS[name]())
+
+    async def run(self, users: int, names: list, duration: float, warmup: bool) -> float:
+
+        self.loop = asyncio.get_running_loop()
+
+        limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as http:
+
+            self.http = http
+
+            # первый проход без записи: шаблоны, пул рендера, precompute
+            if warmup:
+                for name in names:
+                    await self.scenario(VirtualUser(0), SCENARIOS[name]())
+
+            self.recording = True
+
+            started = time.perf_counter()
+            until = started + duration
+
+            await asyncio.gather(*[
+                self.user_loop(VirtualUser(n), names, until)
+                for n in range(1, users + 1)
+            ])
+
+            return time.perf_counter() - started
+
+    def summary(self, elapsed: float) -> list:
+
+        rows = []
+
+        for label in sorted(set(self.samples) | set(self.errors)):
+
+            values = self.samples.get(label, [])
+            errors = self.errors.get(label, 0)
+
+            row = {
+                "step": label,
+                "count": len(values),
+                "errors": errors,
+                "throughput_per_s": round(len(values) / elapsed, 3),
+            }
+
+            if values:
+                row.update({
+                    "p50_ms": round(percentile(values, 50) * 1000, 1),
+                    "p95_ms": round(percentile(values, 95) * 1000, 1),
+                    "p99_ms": round(percentile(values, 99) * 1000, 1),
+                    "max_ms": round(max(values) * 1000, 1),
+                })
+
+            rows.append(row)
+
+        return rows
+
+
+# ======================================================
+# Bot process
+# ======================================================
+
+def spawn_bot(port: int, api: FakeBotAPI, db: FakePostgREST, workdir: str, log):
+
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123456:LOAD-TEST",
+        "PORT": str(port),
+        "PUBLIC_URL": f"http://127.0.0.1:{port}",
+        "TELEGRAM_API_URL": api.url,
+        "SUPABASE_URL": db.url,
+        "SUPABASE_KEY": "fake",
+        "STATE_DB": os.path.join(workdir, "bot_state.sqlite3"),
+        "PYTHONUNBUFFERED": "1",
+    }
+
+    return subprocess.Popen(
+        [sys.executable, "generate_contract_bot.py"],
+        cwd=ROOT,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_for_webhook(url: str, api: FakeBotAPI, bot, timeout: float = 60):
+
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+
+        if bot is not None and bot.poll() is not None:
+            raise RuntimeError(f"bot exited with code {bot.returncode}")
+
+        if api.webhook_set.is_set():
+            try:
+                async with httpx.AsyncClient() as http:
+                    # пустое тело PTB отклоняет, но сервер уже слушает
+                    await http.post(url, content=b"{}")
+                return
+            except httpx.TransportError:
+                pass
+
+        await asyncio.sleep(0.2)
+
+    raise RuntimeError("bot did not start listening in time")
+
+
+# ======================================================
+# CLI
+# ======================================================
+
+def main(argv=None) -> int:
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.webhook_load")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of recorded load")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--think", type=float, default=0.0, help="pause between a user's steps, seconds")
+    parser.add_argument("--timeout", type=float, default=60, help="max wait for a step's replies, seconds")
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--contracts", type=int, default=2000, help="rows seeded into the fake DB")
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds added to every DB request")
+    parser.add_argument("--db-jitter", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=18443, help="webhook port of the spawned bot")
+    parser.add_argument("--bot-url", help="webhook of an already running bot; nothing is spawned")
+    parser.add_argument("--api-port", type=int, default=0)
+    parser.add_argument("--db-port", type=int, default=0)
+    parser.add_argument("--out", help="JSON file (default benchmarks/results/webhook-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    out = Path(args.out).resolve() if args.out else (
+        ROOT / "benchmarks" / "results" / f"webhook-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+
+    webhook_url = args.bot_url or f"http://127.0.0.1:{args.port}/webhook"
+
+    test = LoadTest(webhook_url, args.timeout, args.think)
+
+    db = FakePostgREST(port=args.db_port, latency=args.db_latency, jitter=args.db_jitter)
+    db.seed(**datasets.tables(args.contracts, args.expenses))
+
+    api = FakeBotAPI(port=args.api_port, on_call=test.on_call)
+
+    bot = None
+
+    with db, api, tempfile.TemporaryDirectory() as workdir:
+
+        log_path = os.path.join(workdir, "bot.log")
+
+        with open(log_path, "w", encoding="utf-8") as log:
+
+            if args.bot_url:
+                print("🟡 using running bot at", webhook_url)
+                print("🟡 it must use TELEGRAM_API_URL =", api.url, "and SUPABASE_URL =", db.url)
+                api.webhook_set.set()
+            else:
+                bot = spawn_bot(args.port, api, db, workdir, log)
+
+            try:
+                asyncio.run(wait_for_webhook(webhook_url, api, bot))
+
+                elapsed = asyncio.run(test.run(
+                    args.users,
+                    args.scenarios,
+                    args.duration,
+                    warmup=not args.no_warmup,
+                ))
+
+            except RuntimeError as e:
+                log.flush()
+                print("🔥", e)
+
+                with open(log_path, encoding="utf-8") as f:
+                    print(f.read()[-4000:])
+
+                return 1
+
+            finally:
+                if bot is not None:
+                    bot.terminate()
+                    try:
+                        bot.wait(timeout=15)
+                    except subprocess.TimeoutExpired:
+                        bot.kill()
+
+    steps = test.summary(elapsed)
+
+    for row in steps:
+        print(
+            f"{row['step']:>24}  n {row['count']:5}  err {row['errors']:3}  "
+            f"p50 {row.get('p50_ms', 0):8.1f}  p95 {row.get('p95_ms', 0):8.1f}  "
+            f"p99 {row.get('p99_ms', 0):8.1f} ms  {row['throughput_per_s']:7.2f}/s"
+        )
+
+    total = sum(row["count"] for row in steps)
+
+    print(f"🟢 {total} updates in {elapsed:.1f} s = {total / elapsed:.1f}/s, late replies: {test.late}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "users": args.users,
+        "duration_s": round(elapsed, 3),
+        "scenarios": args.scenarios,
+        "think_s": args.think,
+        "db_latency_s": args.db_latency,
+        "contracts": args.contracts,
+        "updates": total,
+        "updates_per_s": round(total / elapsed, 3),
+        "late_replies": test.late,
+        "steps": steps,
+    }
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("🟢 saved:", out)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
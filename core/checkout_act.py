@@ -2,6 +2,9 @@ from docx import Document
 from datetime import datetime
 from docx.shared import Pt
 
+from core.docx_template import templates
+from core.output import render_to_bytes
+from core.settlement import stay_nights, total_penalties
 from core.act_localization import (
     get_lang,
     yes_no,
@@ -17,12 +20,12 @@ from core.act_localization import (
 
 def build_checkout_act(
     template_path: str,
-    output_path: str,
+    filename: str,
     contract: dict,
     violations: list,
 ):
 
-    doc = Document(template_path)
+    template = templates.get(template_path)
 
     lang = get_lang(contract)
 
@@ -45,11 +48,11 @@ def build_checkout_act(
     # nights
     # ------------------------------
 
-    lived_nights = max(0, (actual - start).days)
-
-    total_nights = contract.get("nights") or 0
-
-    unused_nights = max(0, total_nights - lived_nights)
+    lived_nights, unused_nights = stay_nights(
+        start,
+        actual,
+        contract.get("nights"),
+    )
 
     # ------------------------------
     # finance
@@ -65,7 +68,7 @@ def build_checkout_act(
 
     extra_due = contract.get("extra_due_amount") or 0
 
-    penalties_total = sum(v["amount"] for v in violations)
+    penalties_total = total_penalties(violations)
 
     # ------------------------------
     # localized values
@@ -108,67 +111,16 @@ def build_checkout_act(
         "PENALTIES_TOTAL": safe(penalties_total),
     }
 
-    replace_everywhere(doc, values)
-    insert_violations_table(doc, violations, lang)
+    rendered = template.render(values, bold=True, size=Pt(11))
+    insert_violations_table(rendered.document, violations, lang)
 
-    doc.save(output_path)
-
-    return output_path
+    return render_to_bytes(rendered.save, filename)
 
 
 # ======================================================
 # HELPERS
 # ======================================================
 
-def replace_everywhere(doc: Document, data: dict):
-
-    for p in doc.paragraphs:
-        _process_paragraph(p, data)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    _process_paragraph(p, data)
-
-
-def _process_paragraph(p, data):
-
-    text = p.text
-
-    keys_used = [k for k in data if f"{{{{{k}}}}}" in text]
-
-    if not keys_used:
-        return
-
-    for r in p.runs:
-        r.text = ""
-
-    i = 0
-    while i < len(text):
-
-        replaced = False
-
-        for k in keys_used:
-
-            ph = f"{{{{{k}}}}}"
-
-            if text.startswith(ph, i):
-                run = p.add_run(str(data[k]))
-                run.font.size = Pt(11)
-                run.bold = True
-                i += len(ph)
-                replaced = True
-                break
-
-        if not replaced:
-            run = p.add_run(text[i])
-            i += 1
-
-
-# --------------------------------------------------
-
-
 def insert_violations_table(doc: Document, violations: list, lang: str):
 
     marker = "{{VIOLATIONS_TABLE}}"
@@ -0,0 +1,62 @@
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from core.constants import CONTRACT_TEMPLATE, ACT_TEMPLATE, CHECKOUT_ACT_TEMPLATE
+from core.docx_template import templates
+from core.output import render_to_bytes
+
+
+# ======================================================
+# Contract + act generation
+# ======================================================
+
+def generate_docs(data):
+
+    safe = data["CLIENT_NAME"].replace(" ", "_")
+    code = data.get("CONTRACT_CODE", "")
+
+    outputs = []
+
+    for tpl, prefix in [
+        (CONTRACT_TEMPLATE, "contract"),
+        (ACT_TEMPLATE, "act"),
+    ]:
+        doc = templates.get(tpl, prepare=add_page_numbers).render(data)
+
+        outputs.append(render_to_bytes(doc.save, f"{prefix}_{safe}_{code}.docx"))
+
+    return outputs
+
+
+def add_page_numbers(doc):
+
+    section = doc.sections[0]
+    footer = section.footer
+
+    p = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    run = p.add_run()
+
+    fldChar1 = OxmlElement('w:fldChar')
+    fldChar1.set(qn('w:fldCharType'), 'begin')
+
+    instrText = OxmlElement('w:instrText')
+    instrText.text = "PAGE"
+
+    fldChar2 = OxmlElement('w:fldChar')
+    fldChar2.set(qn('w:fldCharType'), 'end')
+
+    run._r.append(fldChar1)
+    run._r.append(instrText)
+    run._r.append(fldChar2)
+
+
+def preload_templates():
+
+    templates.preload([
+        (CONTRACT_TEMPLATE, add_page_numbers),
+        (ACT_TEMPLATE, add_page_numbers),
+        CHECKOUT_ACT_TEMPLATE,
+    ])
@@ -0,0 +1,346 @@
+import io
+import os
+import re
+import threading
+import zipfile
+from copy import deepcopy
+
+import docx
+from docx.document import Document as DocumentObject
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+
+
+# ======================================================
+# {{KEY}} placeholder engine shared by contract/act/checkout act
+# ======================================================
+
+PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+
+# run children that only carry text; anything else (drawings, fields,
+# page breaks, ...) is left untouched
+_TEXT_TAGS = {
+    qn("w:rPr"),
+    qn("w:t"),
+    qn("w:tab"),
+    qn("w:lastRenderedPageBreak"),
+}
+
+# zero-width paragraph markup that may sit between the runs of one token
+_TRANSPARENT_TAGS = {
+    qn("w:proofErr"),
+    qn("w:bookmarkStart"),
+    qn("w:bookmarkEnd"),
+}
+
+
+def replace_everywhere(doc, data: dict, bold: bool | None = True, size=None):
+
+    for p in iter_paragraphs(doc):
+        render_paragraph(p, data, bold=bold, size=size)
+
+
+def iter_paragraphs(doc):
+
+    yield from doc.paragraphs
+
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                yield from cell.paragraphs
+
+
+def render_paragraph(p, data: dict, bold: bool | None = True, size=None):
+    """
+    Replaces known {{KEY}} tokens in one pass.
+
+    Literal text keeps the formatting of the run it came from, each value
+    gets the formatting of the run its placeholder started in plus
+    `bold` / `size`. Unknown keys stay as they are.
+    """
+
+    for group in _text_run_groups(p):
+        _render_group(p, group, data, bold, size)
+
+
+# --------------------------------------------------
+
+
+def _is_text_run(r) -> bool:
+
+    for child in r:
+
+        if child.tag == qn("w:br"):
+            if child.get(qn("w:type")) not in (None, "textWrapping"):
+                return False
+            continue
+
+        if child.tag not in _TEXT_TAGS:
+            return False
+
+    return True
+
+
+def _text_run_groups(p):
+
+    group = []
+
+    for child in list(p._p):
+
+        if child.tag == qn("w:r") and _is_text_run(child):
+            group.append(child)
+            continue
+
+        if child.tag in _TRANSPARENT_TAGS:
+            continue
+
+        if group:
+            yield group
+            group = []
+
+    if group:
+        yield group
+
+
+def _render_group(p, group, data, bold, size):
+
+    runs = [Run(r, p) for r in group]
+    texts = [r.text for r in runs]
+    text = "".join(texts)
+
+    if "{{" not in text:
+        return
+
+    matches = [
+        m for m in PLACEHOLDER_RE.finditer(text)
+        if m.group(1) in data
+    ]
+
+    if not matches:
+        return
+
+    # offset of each source run inside `text`
+    bounds = []
+    pos = 0
+    for t in texts:
+        bounds.append((pos, pos + len(t)))
+        pos += len(t)
+
+    def run_at(offset):
+        for i, (a, b) in enumerate(bounds):
+            if a <= offset < b:
+                return group[i]
+        return group[-1]
+
+    pieces = []
+
+    def literal(start, end):
+        for i, (a, b) in enumerate(bounds):
+            lo, hi = max(a, start), min(b, end)
+            if lo < hi:
+                pieces.append((text[lo:hi], group[i], False))
+
+    pos = 0
+    for m in matches:
+        literal(pos, m.start())
+
+        value = data[m.group(1)]
+        pieces.append((
+            "" if value is None else str(value),
+            run_at(m.start()),
+            True,
+        ))
+
+        pos = m.end()
+
+    literal(pos, len(text))
+
+    anchor = group[0]
+
+    for piece, src, is_value in pieces:
+
+        new_r = OxmlElement("w:r")
+
+        if src.rPr is not None:
+            new_r.append(deepcopy(src.rPr))
+
+        run = Run(new_r, p)
+        run.text = piece
+
+        if is_value:
+            if bold is not None:
+                run.bold = bold
+            if size is not None:
+                run.font.size = size
+
+        anchor.addprevious(new_r)
+
+    for r in group:
+        r.getparent().remove(r)
+
+
+# ======================================================
+# Compiled templates
+# ======================================================
+
+class CompiledTemplate:
+    """
+    A template parsed once.
+
+    `prepare(doc)` runs a single time at compile (page numbers etc.).
+    Placeholder paragraphs are recorded as child-index paths from the
+    document root, so a render deep-copies the parsed tree, fills only
+    those paragraphs and writes the zip with every other part reused.
+    """
+
+    def __init__(self, path: str, prepare=None):
+
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+
+        master = docx.Document(path)
+
+        if prepare is not None:
+            prepare(master)
+
+        buf = io.BytesIO()
+        master.save(buf)
+
+        with zipfile.ZipFile(io.BytesIO(buf.getvalue())) as z:
+            self._entries = [(i.filename, z.read(i)) for i in z.infolist()]
+
+        self._master = master
+        self._document_name = master.part.partname.lstrip("/")
+        self.slots = _placeholder_slots(master)
+
+    def render(self, data: dict, bold: bool | None = True, size=None):
+
+        element = deepcopy(self._master.element)
+
+        for path, keys in self.slots:
+
+            if keys.isdisjoint(data):
+                continue
+
+            p = _resolve(element, path)
+            render_paragraph(Paragraph(p, None), data, bold=bold, size=size)
+
+        return RenderedDocument(self, element)
+
+
+class RenderedDocument:
+
+    def __init__(self, template: CompiledTemplate, element):
+        self.template = template
+        self.document = DocumentObject(element, template._master.part)
+
+    def save(self, path_or_stream):
+
+        tpl = self.template
+        body = serialize_part_xml(self.document.element)
+
+        with zipfile.ZipFile(path_or_stream, "w") as z:
+            for name, blob in tpl._entries:
+
+                if name == tpl._document_name:
+                    blob = body
+
+                if name.startswith("word/media/"):
+                    z.writestr(name, blob, zipfile.ZIP_STORED)
+                else:
+                    z.writestr(name, blob, zipfile.ZIP_DEFLATED)
+
+        return path_or_stream
+
+
+class TemplateCache:
+    """
+    path -> CompiledTemplate, recompiled when the file's mtime changes.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, prepare=None) -> CompiledTemplate:
+
+        key = (path, prepare)
+        mtime = os.stat(path).st_mtime_ns
+
+        tpl = self._items.get(key)
+
+        if tpl is not None and tpl.mtime == mtime:
+            return tpl
+
+        with self._lock:
+
+            tpl = self._items.get(key)
+
+            if tpl is None or tpl.mtime != mtime:
+                tpl = CompiledTemplate(path, prepare)
+                self._items[key] = tpl
+
+        return tpl
+
+    def preload(self, specs):
+        """
+        specs: iterable of path or (path, prepare)
+        """
+
+        for spec in specs:
+            if isinstance(spec, str):
+                self.get(spec)
+            else:
+                self.get(*spec)
+
+
+templates = TemplateCache()
+
+
+# --------------------------------------------------
+
+
+def _placeholder_slots(doc) -> list:
+
+    slots = []
+    seen = set()
+
+    for p in iter_paragraphs(doc):
+
+        if p._p in seen:
+            continue
+        seen.add(p._p)
+
+        keys = set()
+        for group in _text_run_groups(p):
+            text = "".join(Run(r, p).text for r in group)
+            keys.update(PLACEHOLDER_RE.findall(text))
+
+        if keys:
+            slots.append((_path_of(doc.element, p._p), frozenset(keys)))
+
+    return slots
+
+
+def _path_of(root, el) -> tuple:
+
+    path = []
+
+    while el is not root:
+        parent = el.getparent()
+        path.append(parent.index(el))
+        el = parent
+
+    return tuple(reversed(path))
+
+
+def _resolve(root, path):
+
+    el = root
+    for i in path:
+        el = el[i]
+
+    return el
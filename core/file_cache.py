@@ -0,0 +1,56 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+
+# ======================================================
+# input hash -> Telegram file_id
+# ======================================================
+
+def content_key(kind: str, *inputs) -> str:
+    """
+    Stable hash of everything a report is built from. Same rows (in the
+    same order) -> same key -> same file. Seconds of CPU on large
+    tables, so the bot calls it through RenderPool.
+    """
+
+    h = hashlib.sha256(kind.encode())
+
+    for part in inputs:
+        h.update(b"\0")
+        h.update(json.dumps(part, sort_keys=True, default=str, ensure_ascii=False).encode())
+
+    return f"{kind}:{h.hexdigest()}"
+
+
+class FileIdCache:
+    """
+    Remembers the file_id Telegram gave an uploaded report, keyed by
+    content_key() of its inputs. A hit means the report needs neither a
+    rebuild nor an upload. file_ids stay valid on Telegram's side, so
+    evicting (LRU) only costs one more upload.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+
+        file_id = self._items.get(key)
+
+        if file_id is not None:
+            self._items.move_to_end(key)
+
+        return file_id
+
+    def put(self, key: str, file_id: str):
+
+        self._items[key] = file_id
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+
+file_ids = FileIdCache()
@@ -0,0 +1,52 @@
+import importlib
+import os
+
+
+# 0 imports every builder at startup, as before (fails fast on a
+# missing dependency instead of on the first report)
+LAZY_IMPORTS = os.environ.get("LAZY_IMPORTS", "1") != "0"
+
+
+# ======================================================
+# Builders imported on first call
+# ======================================================
+
+class LazyFunction:
+    """
+    Stand-in for "module:function" that imports the module on the first
+    call. Pickles as the name alone, so handing one to RenderPool does
+    not import python-docx / openpyxl in the bot process — only the
+    worker that runs it does.
+    """
+
+    def __init__(self, target: str):
+        self.target = target
+        self.__name__ = target.rpartition(":")[2]
+        self._fn = None
+
+    def resolve(self):
+
+        if self._fn is None:
+            module, _, name = self.target.partition(":")
+            self._fn = getattr(importlib.import_module(module), name)
+
+        return self._fn
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __reduce__(self):
+        return LazyFunction, (self.target,)
+
+    def __repr__(self):
+        return f"<lazy {self.target}>"
+
+
+def lazy(target: str):
+
+    fn = LazyFunction(target)
+
+    if not LAZY_IMPORTS:
+        return fn.resolve()
+
+    return fn
@@ -0,0 +1,201 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# longest str/bytes field written as is; longer ones are cut
+LOG_BODY_LIMIT = int(os.environ.get("LOG_BODY_LIMIT", 512))
+
+# records waiting for the writer thread; past this they are dropped
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+# "event=rate,..." e.g. "db.fetch_fixed=0.1,db.violation_insert=1";
+# warnings and errors are never sampled
+LOG_SAMPLE = os.environ.get("LOG_SAMPLE", "")
+
+
+def parse_rates(spec: str) -> dict:
+
+    rates = {}
+
+    for part in spec.split(","):
+
+        name, _, rate = part.strip().partition("=")
+
+        if name and rate:
+            rates[name] = float(rate)
+
+    return rates
+
+
+SAMPLE_RATES = parse_rates(LOG_SAMPLE)
+
+
+def truncate(value, limit: int = LOG_BODY_LIMIT):
+
+    if isinstance(value, (bytes, bytearray)):
+        extra = len(value) - limit
+        text = bytes(value[:limit]).decode("utf-8", errors="replace")
+        return text + f"…(+{extra} bytes)" if extra > 0 else text
+
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + f"…(+{len(value) - limit} chars)"
+
+    return value
+
+
+# ======================================================
+# JSON lines, written from a background thread
+# ======================================================
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+
+        for key, value in getattr(record, "fields", {}).items():
+            entry[key] = truncate(value)
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread and never blocks the caller: a
+    full queue drops the record and counts it.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        # formatting happens in the writer thread; only the traceback
+        # has to be rendered here, while its frames still exist
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter(QueueListener):
+
+    def enqueue_sentinel(self):
+        # на выходе ждём, пока поток допишет очередь, а не теряем стоп
+        self.queue.put(self._sentinel)
+
+
+_listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None):
+    """
+    Routes every logger (ours, telegram, httpx, tornado) through one
+    queue to a thread that writes JSON lines to stdout. Idempotent.
+    """
+
+    global _listener
+
+    if _listener is not None:
+        return
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    # по строке на каждый HTTP-запрос и запуск job — только на DEBUG
+    for name in ("httpx", "apscheduler"):
+        logging.getLogger(name).setLevel(max(root.level, logging.WARNING))
+
+    _listener = LogWriter(handler.queue, writer)
+    _listener.start()
+
+    atexit.register(_listener.stop)
+
+
+# ======================================================
+# Event loggers
+# ======================================================
+
+class EventLogger:
+    """
+    log.info("event_name", key=value, ...) -> one JSON line with the
+    fields. Events below WARNING are kept with the LOG_SAMPLE rate for
+    their name (default 1).
+    """
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+        self._prefix = name.rsplit(".", 1)[0] + "."
+
+    def _emit(self, level: int, event: str, fields: dict, exc_info=None):
+
+        if not self._logger.isEnabledFor(level):
+            return
+
+        if level < logging.WARNING:
+
+            rate = SAMPLE_RATES.get(self._prefix + event, SAMPLE_RATES.get(event, 1.0))
+
+            if rate < 1.0 and random.random() >= rate:
+                return
+
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        self._emit(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._emit(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._emit(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc: BaseException | None = None, **fields):
+        self._emit(
+            logging.ERROR,
+            event,
+            fields,
+            exc_info=(type(exc), exc, exc.__traceback__) if exc is not None else None,
+        )
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
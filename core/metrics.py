@@ -0,0 +1,240 @@
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# counters of the DB calls in progress in this task, innermost last
+_db_bytes = ContextVar("db_bytes", default=())
+
+
+class Histogram:
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+
+        self.sum += value
+        self.count += 1
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+# ======================================================
+# Registry + Prometheus text format
+# ======================================================
+
+class Metrics:
+    """
+    In-process counters and histograms, rendered for GET /metrics in
+    the Prometheus text format.
+
+    Names are declared once with describe(); samples are keyed by
+    (name, labels). `collectors` are callables returning extra
+    (name, labels, value) counters read at scrape time (cache hits, ...).
+    """
+
+    def __init__(self):
+        self._help = {}         # name -> (type, help)
+        self._counters = {}     # (name, labels) -> float
+        self._histograms = {}   # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+        self.collectors = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: dict, value: float = 1):
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float, buckets=LATENCY_BUCKETS):
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+
+            hist = self._histograms.get(key)
+
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+
+            hist.observe(value)
+
+    # --------------------------------------------------
+
+    def render(self) -> str:
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (h.buckets, list(h.counts), h.sum, h.count)
+                for key, h in self._histograms.items()
+            }
+
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                counters[(name, tuple(sorted(labels.items())))] = value
+
+        lines = []
+        seen = set()
+
+        def header(name):
+
+            if name in seen:
+                return
+
+            seen.add(name)
+            kind, help_text = self._help.get(name, ("untyped", ""))
+
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+
+            header(name)
+
+            cumulative = 0
+
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels) -> str:
+
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+metrics.describe("bot_handler_seconds", "histogram", "Telegram handler callback latency")
+metrics.describe("bot_handler_errors_total", "counter", "Handler callbacks that raised")
+metrics.describe("bot_db_call_seconds", "histogram", "SupabaseClient call latency")
+metrics.describe("bot_db_call_errors_total", "counter", "SupabaseClient calls that raised")
+metrics.describe("bot_db_response_bytes", "histogram", "PostgREST response bytes per SupabaseClient call")
+metrics.describe("bot_webhook_request_bytes", "histogram", "Update JSON size received on the webhook")
+
+
+# ======================================================
+# Wrappers
+# ======================================================
+
+def instrument_handler(callback):
+
+    name = getattr(callback, "__name__", repr(callback))
+    labels = {"handler": name}
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+
+        start = time.perf_counter()
+
+        try:
+            return await callback(update, context)
+        except Exception:
+            metrics.inc("bot_handler_errors_total", labels)
+            raise
+        finally:
+            metrics.observe("bot_handler_seconds", labels, time.perf_counter() - start)
+
+    return wrapper
+
+
+def instrument_conversation(conv):
+    """
+    Wraps the callback of every handler in a ConversationHandler.
+    """
+
+    groups = [conv.entry_points, conv.fallbacks, *conv.states.values()]
+
+    for handlers in groups:
+        for handler in handlers:
+            handler.callback = instrument_handler(handler.callback)
+
+
+def instrument_db_call(method, name: str):
+
+    labels = {"call": name}
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+
+        received = [0]
+        token = _db_bytes.set(_db_bytes.get() + (received,))
+
+        start = time.perf_counter()
+
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            metrics.inc("bot_db_call_errors_total", labels)
+            raise
+        finally:
+            metrics.observe("bot_db_call_seconds", labels, time.perf_counter() - start)
+            metrics.observe("bot_db_response_bytes", labels, received[0], SIZE_BUCKETS)
+
+            _db_bytes.reset(token)
+
+    return wrapper
+
+
+def instrument_client(client):
+    """
+    Replaces every public coroutine method of `client` (the
+    SupabaseClient instance) with a timed one. Calls made inside other
+    calls are timed too; their response bytes count for both.
+    """
+
+    for name, method in inspect.getmembers(client, inspect.iscoroutinefunction):
+
+        if name.startswith("_") or name == "aclose":
+            continue
+
+        setattr(client, name, instrument_db_call(method, name))
+
+
+def count_response(size: int):
+    """
+    Called by the HTTP layer of db/client.py with each response size.
+    """
+
+    for received in _db_bytes.get():
+        received[0] += size
@@ -0,0 +1,31 @@
+import io
+from dataclasses import dataclass
+
+
+# ======================================================
+# In-memory build results
+# ======================================================
+
+@dataclass(frozen=True, slots=True)
+class OutputFile:
+    """
+    A rendered report/document: the file name shown in Telegram and its
+    bytes. Builders return these instead of writing to a shared path,
+    so concurrent builds can't overwrite each other and there is nothing
+    to clean up on disk.
+    """
+
+    filename: str
+    content: bytes
+
+
+def render_to_bytes(save, filename: str) -> OutputFile:
+    """
+    `save` is anything that writes to a stream: Workbook.save,
+    Document.save, RenderedDocument.save.
+    """
+
+    buf = io.BytesIO()
+    save(buf)
+
+    return OutputFile(filename, buf.getvalue())
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from enum import IntEnum
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from core.log import get_logger
+
+
+log = get_logger(__name__)
+
+# project root: the state file must not depend on the working directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where conversation state lives. On Render point this at a persistent
+# disk mount, otherwise a redeploy starts from an empty file. A relative
+# path is taken from the project root.
+STATE_DB = os.path.join(BASE_DIR, os.environ.get("STATE_DB", "bot_state.sqlite3"))
+
+# seconds between persistence runs (PTB collects the changed user ids
+# in between and hands them over in one batch)
+STATE_FLUSH_INTERVAL = float(os.environ.get("STATE_FLUSH_INTERVAL", 5))
+
+
+SCHEMA = """
+create table if not exists user_data (
+    id integer primary key,
+    data blob not null
+);
+create table if not exists chat_data (
+    id integer primary key,
+    data blob not null
+);
+create table if not exists kv (
+    name text primary key,
+    data blob not null
+);
+create table if not exists conversations (
+    name text not null,
+    key text not null,
+    state blob not null,
+    primary key (name, key)
+);
+"""
+
+
+# ======================================================
+# SQLite-backed persistence for the conversation flow
+# ======================================================
+
+class SQLitePersistence(BasePersistence):
+    """
+    Keeps user_data / chat_data / bot_data / conversation states in one
+    SQLite file (WAL mode).
+
+    update_* only stage the new value in memory. Everything staged by one
+    Application.update_persistence run is written in one transaction on
+    a worker thread, so a handler never waits for the disk. A failed
+    write keeps its batch staged for the next run. flush() (on shutdown)
+    writes whatever is still staged.
+    """
+
+    def __init__(
+        self,
+        path: str = STATE_DB,
+        store_data: PersistenceInput | None = None,
+        update_interval: float = STATE_FLUSH_INTERVAL,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+
+        self.path = path
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute("pragma synchronous=normal")
+        self._db.executescript(SCHEMA)
+
+        # serializes the writer thread and flush()
+        self._db_lock = threading.Lock()
+
+        self._pending = {}      # (table, key) -> blob | None (delete)
+        self._write_task = None
+
+    # --------------------------------------------------
+    # load
+    # --------------------------------------------------
+
+    def _read_table(self, table: str) -> dict:
+
+        rows = self._db.execute(f"select id, data from {table}").fetchall()
+
+        return {i: pickle.loads(data) for i, data in rows}
+
+    def _read_kv(self, name: str, default=None):
+
+        row = self._db.execute("select data from kv where name = ?", (name,)).fetchone()
+
+        return pickle.loads(row[0]) if row else default
+
+    async def get_user_data(self) -> dict:
+        return self._read_table("user_data")
+
+    async def get_chat_data(self) -> dict:
+        return self._read_table("chat_data")
+
+    async def get_bot_data(self) -> dict:
+        return self._read_kv("bot_data", {})
+
+    async def get_callback_data(self):
+        return self._read_kv("callback_data")
+
+    async def get_conversations(self, name: str) -> dict:
+
+        rows = self._db.execute(
+            "select key, state from conversations where name = ?",
+            (name,),
+        ).fetchall()
+
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    # --------------------------------------------------
+    # stage
+    # --------------------------------------------------
+
+    def _stage(self, table: str, key, value, delete: bool = False):
+
+        self._pending[(table, key)] = None if delete else pickle.dumps(value)
+
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage("user_data", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage("chat_data", chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._stage("kv", "bot_data", data)
+
+    async def update_callback_data(self, data) -> None:
+        self._stage("kv", "callback_data", data)
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+
+        key = json.dumps(list(key))
+
+        if new_state is None:
+            self._stage("conversations", (name, key), None, delete=True)
+            return
+
+        # plain int: the pickled state must not depend on where the enum lives
+        if isinstance(new_state, IntEnum):
+            new_state = int(new_state)
+
+        self._stage("conversations", (name, key), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage("user_data", user_id, None, delete=True)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage("chat_data", chat_id, None, delete=True)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # --------------------------------------------------
+    # write
+    # --------------------------------------------------
+
+    async def _write_soon(self):
+
+        # let the rest of the current update_persistence run stage first
+        await asyncio.sleep(0)
+
+        # values staged while a write was in flight go out right after it;
+        # after a failure wait for the next update_persistence run
+        while self._pending:
+            if not await asyncio.to_thread(self._write_pending):
+                break
+
+    def _write_pending(self) -> bool:
+
+        with self._db_lock:
+
+            pending, self._pending = self._pending, {}
+
+            if not pending:
+                return True
+
+            try:
+                with self._db:
+                    self._db.execute("begin")
+
+                    for (table, key), blob in pending.items():
+                        self._write_row(table, key, blob)
+
+            except sqlite3.Error as e:
+                # disk full / database locked: put the batch back, but do
+                # not overwrite what was staged while the write was running
+                for k, blob in pending.items():
+                    self._pending.setdefault(k, blob)
+
+                log.error("state_write_error", exc=e, path=self.path, rows=len(pending))
+                return False
+
+            return True
+
+    def _write_row(self, table: str, key, blob):
+
+        if table == "conversations":
+            name, conv_key = key
+
+            if blob is None:
+                self._db.execute(
+                    "delete from conversations where name = ? and key = ?",
+                    (name, conv_key),
+                )
+            else:
+                self._db.execute(
+                    "insert or replace into conversations (name, key, state) values (?, ?, ?)",
+                    (name, conv_key, blob),
+                )
+            return
+
+        column = "name" if table == "kv" else "id"
+
+        if blob is None:
+            self._db.execute(f"delete from {table} where {column} = ?", (key,))
+        else:
+            self._db.execute(
+                f"insert or replace into {table} ({column}, data) values (?, ?)",
+                (key, blob),
+            )
+
+    async def flush(self) -> None:
+
+        if self._write_task is not None:
+            await self._write_task
+
+        self._write_pending()
+        self._db.close()
@@ -0,0 +1,193 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from core.log import get_logger
+
+
+# full rebuild of every artefact, seconds
+PRECOMPUTE_INTERVAL = float(os.environ.get("PRECOMPUTE_INTERVAL", 900))
+
+# pause after a write before rebuilding, so a burst of writes costs one build
+PRECOMPUTE_DELAY = float(os.environ.get("PRECOMPUTE_DELAY", 3))
+
+log = get_logger(__name__)
+
+
+@dataclass
+class Artefact:
+    """
+    One built dashboard/report: either `text` or a file (`content` +
+    `filename`). `file_id` is filled in after the first upload so later
+    taps resend the Telegram copy; `digest` is the content_key of the
+    report's inputs (core/file_cache.py).
+    """
+
+    name: str
+    version: int
+    built_at: datetime
+    text: str | None = None
+    content: bytes | None = None
+    filename: str | None = None
+    file_id: str | None = None
+    digest: str | None = None
+
+
+# ======================================================
+# Precomputed dashboards / reports
+# ======================================================
+
+class Precomputed:
+    """
+    Named artefacts rebuilt in the background by the JobQueue.
+
+    Each artefact has a data version. Writes bump it through
+    on_invalidate(tags) (hooked to the DB cache), which also schedules a
+    rebuild PRECOMPUTE_DELAY seconds later. get() only returns an
+    artefact built from the current version on the current day;
+    everything else is rebuilt, on schedule or on demand.
+    """
+
+    def __init__(self):
+        self._builders = {}     # name -> async () -> dict
+        self._triggers = {}     # name -> tag prefixes
+        self._versions = {}     # name -> int
+        self._items = {}        # name -> Artefact
+        self._locks = {}        # name -> asyncio.Lock
+        self._scheduled = set()
+
+        self.job_queue = None
+
+    def register(self, name: str, builder, triggers=()):
+        """
+        `builder()` returns dict(text=...) or dict(content=..., filename=...).
+        `triggers` are DB cache tag prefixes that make the artefact stale.
+        """
+
+        self._builders[name] = builder
+        self._triggers[name] = tuple(triggers)
+        self._versions.setdefault(name, 0)
+
+    # --------------------------------------------------
+
+    def get(self, name: str) -> Artefact | None:
+
+        art = self._items.get(name)
+
+        if art is None:
+            return None
+
+        if art.version != self._versions[name]:
+            return None
+
+        if art.built_at.date() != date.today():
+            return None
+
+        return art
+
+    async def refresh(self, name: str, force: bool = False) -> Artefact:
+        """
+        Builds `name` now. Callers waiting on a build already in progress
+        get its result instead of starting another one. `force` rebuilds
+        even a fresh artefact (data may change outside the bot); the old
+        one is served meanwhile.
+        """
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+
+        async with lock:
+
+            art = self.get(name)
+
+            if art is not None and not force:
+                return art
+
+            version = self._versions[name]
+
+            built = await self._builders[name]()
+
+            art = Artefact(
+                name=name,
+                version=version,
+                built_at=datetime.now(),
+                **built,
+            )
+
+            self._items[name] = art
+
+            log.info("precomputed", artefact=name, version=version)
+
+            return art
+
+    async def get_or_build(self, name: str) -> Artefact:
+        return self.get(name) or await self.refresh(name)
+
+    # --------------------------------------------------
+
+    def on_invalidate(self, tags):
+
+        stale = [
+            name for name, prefixes in self._triggers.items()
+            if any(tag.startswith(prefixes) for tag in tags)
+        ]
+
+        for name in stale:
+            self._versions[name] += 1
+
+        self.schedule(stale)
+
+    def schedule(self, names, delay: float = PRECOMPUTE_DELAY):
+
+        if self.job_queue is None:
+            return
+
+        for name in names:
+
+            if name in self._scheduled:
+                continue
+
+            self._scheduled.add(name)
+
+            self.job_queue.run_once(
+                self._refresh_job,
+                when=delay,
+                data=name,
+                name=f"precompute:{name}",
+            )
+
+    async def _refresh_job(self, context):
+
+        name = context.job.data
+        self._scheduled.discard(name)
+
+        try:
+            await self.refresh(name)
+        except Exception as e:
+            log.error("precompute_error", exc=e, artefact=name)
+
+    async def _refresh_all_job(self, context):
+
+        for name in self._builders:
+            try:
+                await self.refresh(name, force=True)
+            except Exception as e:
+                log.error("precompute_error", exc=e, artefact=name)
+
+    def start(self, job_queue, interval: float = PRECOMPUTE_INTERVAL):
+
+        if job_queue is None:
+            log.warning("job_queue_missing", detail="artefacts are built on demand")
+            return
+
+        self.job_queue = job_queue
+
+        job_queue.run_repeating(
+            self._refresh_all_job,
+            interval=interval,
+            first=PRECOMPUTE_DELAY,
+            name="precompute:all",
+        )
+
+
+precomputed = Precomputed()
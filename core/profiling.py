@@ -0,0 +1,264 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from core.output import OutputFile
+
+
+# default capture length for /profile without arguments
+PROFILE_UPDATES = int(os.environ.get("PROFILE_UPDATES", 50))
+
+# hard cap, whatever /profile was asked for
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 300))
+
+# rows in the functions / allocators tables of the report
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", 40))
+
+# tracebacks of the profiler itself and of imports are noise
+ALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, limit: int) -> list:
+    """
+    [(file:line, bytes, blocks)] of the memory still held at the
+    snapshot, largest first.
+    """
+
+    stats = snapshot.filter_traces(ALLOC_FILTERS).statistics("lineno")
+
+    return [(str(s.traceback[0]), s.size, s.count) for s in stats[:limit]]
+
+
+class _LoadedStats:
+    """
+    pstats.Stats.add() takes anything with create_stats() + .stats;
+    this is how the raw stats of a worker call are merged in.
+    """
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+# ======================================================
+# Worker side (runs inside RenderPool processes)
+# ======================================================
+
+def run_profiled(call, top: int = PROFILE_TOP):
+    """
+    Runs `call` under cProfile + tracemalloc and returns its result with
+    the raw stats, so the parent merges them into the capture.
+    """
+
+    started = not tracemalloc.is_tracing()
+
+    if started:
+        tracemalloc.start()
+
+    prof = cProfile.Profile()
+
+    try:
+        result = prof.runcall(call)
+
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    prof.create_stats()
+
+    return result, prof.stats, top_allocations(snapshot, top), peak
+
+
+# ======================================================
+# Capture in the bot process
+# ======================================================
+
+@dataclass
+class ProfileSession:
+
+    chat_id: int
+    updates: int | None
+    deadline: float
+    profile: cProfile.Profile
+    started: float = field(default_factory=time.monotonic)
+    started_at: datetime = field(default_factory=datetime.now)
+    own_tracemalloc: bool = False
+    seen: int = 0
+    worker_calls: int = 0
+    worker_stats: list = field(default_factory=list)
+    worker_allocs: Counter = field(default_factory=Counter)
+    worker_blocks: Counter = field(default_factory=Counter)
+    worker_peak: int = 0
+
+
+class Profiler:
+    """
+    One capture at a time, started by the admin /profile command.
+
+    cProfile (deterministic — the stdlib has no sampling profiler) and
+    tracemalloc run on the event loop thread until `updates` updates
+    have been handled or the time runs out. RenderPool jobs started
+    meanwhile are profiled in their worker (run_profiled) and merged in,
+    so generate_docs and the report builders show up too.
+
+    stop() returns a pstats dump (snakeviz, `flameprof x.prof > x.svg`)
+    and a text summary with the top functions and allocators.
+    """
+
+    def __init__(self, top: int = PROFILE_TOP):
+        self.top = top
+        self.session = None
+
+    @property
+    def active(self) -> bool:
+        return self.session is not None
+
+    def start(self, chat_id: int, updates: int | None = None, seconds: float | None = None):
+
+        if self.active:
+            raise RuntimeError("profiling is already running")
+
+        seconds = min(seconds or PROFILE_MAX_SECONDS, PROFILE_MAX_SECONDS)
+
+        own_tracemalloc = not tracemalloc.is_tracing()
+
+        if own_tracemalloc:
+            tracemalloc.start()
+
+        prof = cProfile.Profile()
+
+        self.session = ProfileSession(
+            chat_id=chat_id,
+            updates=updates,
+            deadline=time.monotonic() + seconds,
+            profile=prof,
+            own_tracemalloc=own_tracemalloc,
+        )
+
+        prof.enable()
+
+    def tick(self) -> bool:
+        """
+        Called after each handled update; True when the capture is done.
+        """
+
+        s = self.session
+
+        if s is None:
+            return False
+
+        s.seen += 1
+
+        if s.updates is not None and s.seen >= s.updates:
+            return True
+
+        return time.monotonic() >= s.deadline
+
+    def add_worker(self, stats: dict, allocations: list, peak: int):
+
+        s = self.session
+
+        # задача воркера могла пережить сам захват
+        if s is None:
+            return
+
+        s.worker_calls += 1
+        s.worker_stats.append(stats)
+        s.worker_peak = max(s.worker_peak, peak)
+
+        for where, size, count in allocations:
+            s.worker_allocs[where] += size
+            s.worker_blocks[where] += count
+
+    # --------------------------------------------------
+
+    def stop(self) -> tuple:
+
+        s = self.session
+
+        if s is None:
+            raise RuntimeError("profiling is not running")
+
+        s.profile.disable()
+        self.session = None
+
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+
+        if s.own_tracemalloc:
+            tracemalloc.stop()
+
+        stats = pstats.Stats()
+        stats.add(s.profile)
+
+        for worker in s.worker_stats:
+            stats.add(_LoadedStats(worker))
+
+        stamp = s.started_at.strftime("%Y%m%d_%H%M%S")
+
+        dump = OutputFile(f"profile_{stamp}.prof", marshal.dumps(stats.stats))
+
+        report = OutputFile(
+            f"profile_{stamp}.txt",
+            self._report(s, stats, top_allocations(snapshot, self.top), peak).encode("utf-8"),
+        )
+
+        return dump, report
+
+    def _report(self, s: ProfileSession, stats: pstats.Stats, allocations: list, peak: int) -> str:
+
+        out = io.StringIO()
+
+        out.write(f"started   {s.started_at:%Y-%m-%d %H:%M:%S}\n")
+        out.write(f"duration  {time.monotonic() - s.started:.1f} s\n")
+        out.write(f"updates   {s.seen}\n")
+        out.write(f"render    {s.worker_calls} worker calls\n")
+        out.write("\nflamegraph: flameprof <file>.prof > flame.svg  |  snakeviz <file>.prof\n")
+
+        out.write("\n== Functions by cumulative time (bot + render workers)\n\n")
+
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(self.top)
+
+        out.write(f"\n== Allocators, bot process: held at stop, peak {peak / 2**20:.1f} MiB\n\n")
+        write_allocations(out, allocations)
+
+        if s.worker_calls:
+            out.write(
+                f"\n== Allocators, render workers: held at the end of each call, summed,"
+                f" peak {s.worker_peak / 2**20:.1f} MiB\n\n"
+            )
+            write_allocations(out, [
+                (where, size, s.worker_blocks[where])
+                for where, size in s.worker_allocs.most_common(self.top)
+            ])
+
+        return out.getvalue()
+
+
+def write_allocations(out, allocations: list):
+
+    out.write(f"{'KiB':>10} {'blocks':>8}  where\n")
+
+    for where, size, count in allocations:
+        out.write(f"{size / 1024:>10.1f} {count:>8}  {where}\n")
+
+
+profiler = Profiler()
@@ -0,0 +1,151 @@
+from dataclasses import dataclass, asdict
+from datetime import date, datetime
+
+
+# ======================================================
+# Checkout settlement: refund / extra due for a contract
+# ======================================================
+#
+# Pure functions, no I/O. db/sql/close_contract.sql does the same math
+# inside Postgres; keep the two in sync.
+
+@dataclass(frozen=True, slots=True)
+class Settlement:
+
+    used: int
+    unused: int
+    penalties: int
+    refund: int
+    extra_due: int
+    lived_nights: int
+    unused_nights: int
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def as_date(value) -> date:
+
+    if isinstance(value, datetime):
+        return value.date()
+
+    if isinstance(value, date):
+        return value
+
+    return datetime.fromisoformat(value).date()
+
+
+def stay_nights(start, actual_end, nights) -> tuple[int, int]:
+    """
+    (lived, unused) nights for a stay that ended on `actual_end`.
+    """
+
+    lived = max(0, (as_date(actual_end) - as_date(start)).days)
+
+    return lived, max(0, int(nights or 0) - lived)
+
+
+def total_penalties(violations) -> int:
+    return sum(int(v["amount"]) for v in violations)
+
+
+def settle(
+    contract: dict,
+    penalties: int,
+    actual_checkout_date: date,
+    early_checkout: bool,
+    initiator: str | None,
+    manual_refund: int | None = None,
+) -> Settlement:
+
+    lived_nights, unused_nights = stay_nights(
+        contract["start_date"],
+        actual_checkout_date,
+        contract.get("nights"),
+    )
+
+    price = int(contract["price_per_day"])
+    total_price = int(contract["total_price"])
+    deposit = int(contract["deposit"])
+
+    used_amount = lived_nights * price
+    unused_amount = max(0, total_price - used_amount)
+
+    # --- default calculations ---
+    refund = 0
+    extra_due = 0
+
+    # =============================
+    # NORMAL END
+    # =============================
+    if not early_checkout:
+
+        refund = max(0, deposit - penalties)
+        extra_due = max(0, penalties - deposit)
+
+    # =============================
+    # EARLY CHECKOUT
+    # =============================
+
+    # ---- tenant initiated ----
+    elif initiator == "tenant":
+
+        refund = unused_amount + max(0, deposit - penalties)
+        extra_due = max(0, penalties - deposit)
+
+    # ---- landlord initiated ----
+    elif initiator == "landlord":
+
+        if manual_refund is not None:
+            refund = manual_refund
+
+            total_available = deposit + unused_amount
+            extra_due = max(0, penalties - total_available + refund)
+
+        else:
+            refund = unused_amount + max(0, deposit - penalties)
+            extra_due = max(0, penalties - (deposit + unused_amount))
+
+    return Settlement(
+        used=used_amount,
+        unused=unused_amount,
+        penalties=penalties,
+        refund=refund,
+        extra_due=extra_due,
+        lived_nights=lived_nights,
+        unused_nights=unused_nights,
+    )
+
+
+def settle_many(
+    contracts,
+    penalties: dict,
+    actual_checkout_date: date,
+    early_checkout: bool,
+    initiator: str | None,
+    manual_refund: int | None = None,
+    errors: list | None = None,
+) -> dict:
+    """
+    {contract_code: Settlement} for many contracts at once, with
+    `penalties` as {contract_code: total}. Rows with missing or broken
+    fields are skipped; pass `errors` to collect (row, exception).
+    """
+
+    result = {}
+
+    for c in contracts:
+        try:
+            result[c["contract_code"]] = settle(
+                c,
+                penalties.get(c["contract_code"], 0),
+                actual_checkout_date,
+                early_checkout,
+                initiator,
+                manual_refund,
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            if errors is not None:
+                errors.append((c, e))
+
+    return result
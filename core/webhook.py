@@ -0,0 +1,143 @@
+import asyncio
+import hmac
+import json
+import os
+import signal
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from telegram import Update
+
+from core.log import get_logger
+from core.metrics import metrics, SIZE_BUCKETS
+
+
+log = get_logger(__name__)
+
+# /metrics is served only when set, and only to
+# `Authorization: Bearer <METRICS_TOKEN>`: the port is public
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+
+# ======================================================
+# Webhook + /metrics on one port
+# ======================================================
+
+class WebhookHandler(tornado.web.RequestHandler):
+
+    def initialize(self, app):
+        self.app = app
+
+    async def post(self):
+
+        body = self.request.body
+        metrics.observe("bot_webhook_request_bytes", {}, len(body), SIZE_BUCKETS)
+
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except (ValueError, TypeError, KeyError):
+            raise tornado.web.HTTPError(400)
+
+        if update is None:
+            raise tornado.web.HTTPError(400)
+
+        await self.app.update_queue.put(update)
+
+        self.set_status(200)
+
+    def log_exception(self, typ, value, tb):
+
+        # 400 на мусор в теле — не ошибка сервера
+        if isinstance(value, tornado.web.HTTPError):
+            return
+
+        log.error("webhook_error", exc=value)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+
+    def initialize(self, token: str):
+        self.token = token
+
+    def get(self):
+
+        scheme, _, given = self.request.headers.get("Authorization", "").partition(" ")
+
+        if scheme.lower() != "bearer" or not hmac.compare_digest(given.encode(), self.token.encode()):
+            self.set_header("WWW-Authenticate", "Bearer")
+            raise tornado.web.HTTPError(401)
+
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.render())
+
+
+async def serve_webhook(
+    app,
+    listen: str,
+    port: int,
+    url_path: str,
+    webhook_url: str,
+    on_listening=None,
+    metrics_token: str | None = METRICS_TOKEN,
+):
+    """
+    What Application.run_webhook does, on our own tornado app so that
+    GET /metrics is served next to POST `url_path`. The application is
+    built with .updater(None); updates go straight to its update_queue.
+
+    /metrics exists only with a `metrics_token` and answers 401 to
+    requests without it as a Bearer token.
+
+    `on_listening()` is called once updates are being accepted — for
+    warm-ups that shouldn't delay the first reply.
+    """
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+
+    if app.post_init:
+        await app.post_init(app)
+
+    routes = [(rf"{url_path}/?", WebhookHandler, {"app": app})]
+
+    if metrics_token:
+        routes.append((r"/metrics", MetricsHandler, {"token": metrics_token}))
+
+    server = HTTPServer(tornado.web.Application(
+        routes,
+        # без access-лога на каждый апдейт
+        log_function=lambda handler: None,
+    ))
+
+    try:
+        await app.bot.set_webhook(webhook_url)
+
+        server.listen(port, address=listen)
+        await app.start()
+
+        log.info("webhook_listening", port=port, url=webhook_url, metrics=bool(metrics_token))
+
+        if on_listening is not None:
+            on_listening()
+
+        await stop.wait()
+
+    finally:
+        server.stop()
+        await server.close_all_connections()
+
+        if app.running:
+            await app.stop()
+
+        if app.post_stop:
+            await app.post_stop(app)
+
+        await app.shutdown()
+
+        if app.post_shutdown:
+            await app.post_shutdown(app)
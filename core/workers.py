@@ -0,0 +1,201 @@
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.profiling import profiler, run_profiled
+
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 120))
+
+# start the workers as soon as the webhook is up instead of on the
+# first document (the bot process itself never imports the builders)
+RENDER_PREWARM = os.environ.get("RENDER_PREWARM", "1") != "0"
+
+# imported by every worker on start
+BUILDER_MODULES = (
+    "core.checkout_act",
+    "reports.excel",
+    "reports.finance",
+    "reports.expenses",
+)
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def _warm_worker():
+    from core.documents import preload_templates
+
+    preload_templates()
+
+    for name in BUILDER_MODULES:
+        importlib.import_module(name)
+
+
+def _ready():
+    return True
+
+
+# ======================================================
+# Process pool for DOCX / XLSX builders
+# ======================================================
+
+class RenderPool:
+    """
+    Runs CPU-bound builders in worker processes so handlers keep the
+    event loop free.
+
+    Every worker is a slot with its own single-process executor and runs
+    one job at a time; a job waits for a free slot within its timeout.
+    A job that times out or whose caller is cancelled kills only its own
+    worker — the slot gets a fresh one on the next job, renders running
+    in the other slots are not touched. A job whose worker died under it
+    is retried once on a fresh one.
+
+    Workers are spawned, so each of them re-imports the script the bot
+    was started from as `__mp_main__`: everything at module level of
+    generate_contract_bot.py runs again in every worker (it must stay
+    cheap and side-effect free), only the `if __name__ == "__main__"`
+    block does not.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = RENDER_WORKERS,
+        timeout: float = RENDER_TIMEOUT,
+        initializer=_warm_worker,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.initializer = initializer
+
+        self._executors = [None] * max_workers
+        self._free = None
+        self._loop = None
+
+    def _pool(self, slot: int) -> ProcessPoolExecutor:
+
+        if self._executors[slot] is None:
+            self._executors[slot] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+            )
+
+        return self._executors[slot]
+
+    def _free_slots(self) -> asyncio.Queue:
+
+        # asyncio.Queue привязана к своему event loop, а пул живёт дольше
+        # одного asyncio.run()
+        loop = asyncio.get_running_loop()
+
+        if self._loop is not loop:
+            self._loop = loop
+            self._free = asyncio.Queue()
+
+            for slot in range(self.max_workers):
+                self._free.put_nowait(slot)
+
+        return self._free
+
+    async def run(self, fn, *args, timeout: float | None = None, **kwargs):
+
+        if timeout is None:
+            timeout = self.timeout
+
+        call = functools.partial(fn, *args, **kwargs)
+
+        # во время /profile задача профилируется в самом воркере
+        profiled = profiler.active
+
+        if profiled:
+            call = functools.partial(run_profiled, call)
+
+        def timed_out():
+            return RenderTimeout(f"{getattr(fn, '__name__', fn)} exceeded {timeout}s")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        free = self._free_slots()
+
+        try:
+            slot = await asyncio.wait_for(free.get(), timeout)
+        except asyncio.TimeoutError:
+            raise timed_out() from None
+
+        try:
+            for attempt in (1, 2):
+
+                left = deadline - loop.time()
+
+                if left <= 0:
+                    raise timed_out()
+
+                job = self._pool(slot).submit(call)
+
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(job), left)
+
+                except asyncio.TimeoutError:
+                    self._discard(slot)
+                    raise timed_out() from None
+
+                except asyncio.CancelledError:
+                    self._discard(slot)
+                    raise
+
+                except BrokenProcessPool:
+                    self._discard(slot)
+
+                    if attempt == 2:
+                        raise
+
+                else:
+                    if profiled:
+                        result, stats, allocations, peak = result
+                        profiler.add_worker(stats, allocations, peak)
+
+                    return result
+
+        finally:
+            free.put_nowait(slot)
+
+    def _discard(self, slot: int):
+
+        executor, self._executors[slot] = self._executors[slot], None
+
+        if executor is None:
+            return
+
+        for proc in list((executor._processes or {}).values()):
+            proc.kill()
+
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self):
+        """
+        Starts every worker now; each one imports python-docx, openpyxl
+        and the templates in its own process, off the event loop.
+        """
+
+        for slot in range(self.max_workers):
+            self._pool(slot).submit(_ready)
+
+    def shutdown(self):
+
+        for slot, executor in enumerate(self._executors):
+
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executors[slot] = None
+
+
+render_pool = RenderPool()
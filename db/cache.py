@@ -0,0 +1,127 @@
+import os
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+
+# seconds a cached read may be served without asking Supabase;
+# 0 turns the cache off
+CACHE_TTL = float(os.environ.get("SUPABASE_CACHE_TTL", 60))
+CACHE_SIZE = int(os.environ.get("SUPABASE_CACHE_SIZE", 256))
+
+
+# ======================================================
+# Read-through query cache
+# ======================================================
+
+class QueryCache:
+    """
+    LRU of query results with a TTL per entry.
+
+    Every entry carries tags ("contract:<code>", "fixed_expenses", ...);
+    writes call invalidate(*tags) to drop exactly the reads they affect.
+
+    Each tag has a generation counter. A load remembers the generations
+    it started with and its result is only stored if none of them moved,
+    so a read that raced with a write can't put the old rows back.
+
+    Values are deep-copied in and out: handlers are free to mutate what
+    they get.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._entries = OrderedDict()   # key -> (expires_at, tags, value)
+        self._generations = {}          # tag -> int
+
+        # callables(tags) told about every invalidation (precompute)
+        self.listeners = []
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --------------------------------------------------
+
+    def get(self, key):
+        """
+        (True, value) on a fresh hit, (False, None) otherwise.
+        """
+
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return False, None
+
+        expires_at, _, value = entry
+
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+
+        return True, deepcopy(value)
+
+    def set(self, key, value, tags=(), ttl: float | None = None):
+
+        ttl = self.ttl if ttl is None else ttl
+
+        if ttl <= 0:
+            return
+
+        self._entries[key] = (self.clock() + ttl, frozenset(tags), deepcopy(value))
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *tags):
+
+        tags = set(tags)
+
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+        stale = [
+            key for key, (_, entry_tags, _) in self._entries.items()
+            if entry_tags & tags
+        ]
+
+        for key in stale:
+            del self._entries[key]
+
+        for listener in self.listeners:
+            listener(tags)
+
+    def clear(self):
+        self._entries.clear()
+
+    # --------------------------------------------------
+
+    async def get_or_load(self, key, loader, tags=(), ttl: float | None = None):
+        """
+        Cached value for `key`, or `await loader()` stored under `tags`.
+        """
+
+        hit, value = self.get(key)
+
+        if hit:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+
+        before = {tag: self._generations.get(tag, 0) for tag in tags}
+
+        value = await loader()
+
+        if all(self._generations.get(tag, 0) == gen for tag, gen in before.items()):
+            self.set(key, value, tags, ttl)
+
+        return value
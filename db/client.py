@@ -1,650 +1,975 @@
 import os
-import requests
+import httpx
+from urllib.parse import quote as url_quote
 from datetime import datetime, date, timedelta
 from core.utils import build_contract_code
+from core.log import get_logger
+from core.metrics import count_response
+from core.settlement import Settlement, settle, settle_many, total_penalties
+from db.cache import QueryCache
+from db.singleflight import SingleFlight
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SUPABASE_KEY = os.environ["SUPABASE_KEY"]
 
-HEADERS = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json",
-}
+# rows per request for full-table reads; above PostgREST max-rows the
+# server just returns fewer, paging still reaches the end
+PAGE_SIZE = int(os.environ.get("SUPABASE_PAGE_SIZE", 1000))
 
-def insert_expense(payload):
+# URL-encoded length of one `in.(...)` filter; keeps the request line
+# under the ~8 KB the proxies in front of PostgREST accept
+IN_URL_BUDGET = int(os.environ.get("SUPABASE_IN_URL_BUDGET", 6000))
 
-    url = SUPABASE_URL + "/rest/v1/expenses"
+log = get_logger(__name__)
 
-    r = requests.post(
-        url,
-        json=payload,
-        headers=HEADERS,
-        timeout=10,
-    )
-
-    print("🟡 EXPENSE INSERT:", r.status_code, r.text)
-
-    r.raise_for_status()
-
-def fetch_expenses_by_month(year: str, month: str):
-
-    start = f"{year}-{month}-01"
-
-    if month == "12":
-        end = f"{int(year)+1}-01-01"
-    else:
-        end = f"{year}-{int(month)+1:02}-01"
-
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/expenses"
-        + f"?expense_date=gte.{start}&expense_date=lt.{end}"
-        + "&order=expense_date.asc"
-    )
-
-    r = requests.get(url, headers=HEADERS, timeout=10)
-
-    r.raise_for_status()
 
-    return r.json()
+def log_response(event: str, r):
+    """
+    Status of a write/read for an httpx response. The body goes out
+    only on errors (or at DEBUG), cut to LOG_BODY_LIMIT by the log
+    writer thread.
+    """
 
+    if r.status_code >= 400:
+        log.warning(event, status=r.status_code, body=r.content)
+        return
 
-def fetch_fixed_expense_by_id(fid):
+    log.info(event, status=r.status_code, bytes=len(r.content))
+    log.debug(event + "_body", body=r.content)
 
-    url = SUPABASE_URL + f"/rest/v1/fixed_expenses?id=eq.{fid}"
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
-    r.raise_for_status()
+def quote(value) -> str:
+    return '"' + str(value).replace('"', '\\"') + '"'
 
-    rows = r.json()
-    return rows[0] if rows else None
 
-def delete_fixed_expense(fid):
+def in_list(values) -> str:
+    """
+    PostgREST `in.(...)` operand; values are quoted because contract
+    codes contain `.` and `/`.
+    """
+    return f"in.({','.join(quote(v) for v in values)})"
 
-    url = SUPABASE_URL + f"/rest/v1/fixed_expenses?id=eq.{fid}"
 
-    r = requests.delete(url, headers=HEADERS, timeout=10)
-    r.raise_for_status()
+def keyset_after(row: dict, column: str, desc: bool) -> list:
+    """
+    Filter for the rows that come after `row` in `column.<dir>,id.<dir>`
+    order. Nulls sort as PostgREST does: last on asc, first on desc.
+    """
 
-def update_fixed_expense(fid, payload):
+    op = "lt" if desc else "gt"
+    value = row.get(column)
+    after_id = f"id.{op}.{row['id']}"
 
-    url = SUPABASE_URL + f"/rest/v1/fixed_expenses?id=eq.{fid}"
+    if value is None:
 
-    r = requests.patch(
-        url,
-        headers={**HEADERS, "Prefer": "return=minimal"},
-        json=payload,
-        timeout=10,
-    )
-    r.raise_for_status()
-
-
-def fetch_fixed_expenses():
-
-    url = SUPABASE_URL + "/rest/v1/fixed_expenses?order=id.asc"
-
-    r = requests.get(
-        url,
-        headers=HEADERS,
-        timeout=10,
-    )
-
-    print("🟡 FETCH FIXED:", r.status_code, r.text)
+        if desc:
+            return [("or", f"({column}.not.is.null,and({column}.is.null,{after_id}))")]
 
-    r.raise_for_status()
+        return [(column, "is.null"), ("id", f"{op}.{row['id']}")]
 
-    return r.json()
+    terms = [
+        f"{column}.{op}.{quote(value)}",
+        f"and({column}.eq.{quote(value)},{after_id})",
+    ]
 
-def fetch_contract_violations_for_period(
-    contract_code: str,
-    start_date: str,
-    actual_end_date: str,
-):
+    if not desc:
+        terms.append(f"{column}.is.null")
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/violations"
-        + "?contract_code=eq."
-        + contract_code
-        + "&created_at=gte."
-        + start_date
-        + "&created_at=lte."
-        + actual_end_date
-    )
+    return [("or", f"({','.join(terms)})")]
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
 
-    print("🟡 FETCH PERIOD VIOLATIONS:", r.status_code, r.text)
+def in_chunks(values: list, budget: int = IN_URL_BUDGET):
+    """
+    Splits values into runs whose in_list() fits `budget` URL-encoded
+    chars. A code like `01.02.2025/12` takes ~24, so one request carries
+    ~250 of them; every further ~250 codes cost one more request.
+    """
 
-    r.raise_for_status()
+    chunk, size = [], 0
 
-    return r.json()
+    for v in values:
 
-def fetch_penalties_by_contract_codes(codes: list[str]):
+        # + encoded comma
+        cost = len(url_quote(quote(v), safe="")) + 3
 
-    if not codes:
-        return {}
+        if chunk and size + cost > budget:
+            yield chunk
+            chunk, size = [], 0
 
-    # eq.(a,b,c)
-    in_clause = ",".join(codes)
-
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/violations"
-        + "?contract_code=in.("
-        + in_clause
-        + ")"
-    )
+        chunk.append(v)
+        size += cost
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
+    if chunk:
+        yield chunk
 
-    r.raise_for_status()
 
-    rows = r.json()
+def penalties_by_code(violations, penalties: dict | None = None) -> dict:
 
-    penalties = {}
+    if penalties is None:
+        penalties = {}
 
-    for v in rows:
+    for v in violations:
         penalties.setdefault(v["contract_code"], 0)
         penalties[v["contract_code"]] += int(v["amount"])
 
     return penalties
 
 
+def penalties_from_rpc(rows: list) -> dict:
+    return {r["contract_code"]: int(r["total"]) for r in rows}
 
-def fetch_expenses_last_30_days():
 
-    since = (date.today() - timedelta(days=30)).isoformat()
+def rpc_missing(r) -> bool:
+    """
+    PostgREST answers 404 / PGRST202 when the function from db/sql/
+    hasn't been applied yet (a plain 404 can also come from the function
+    itself, e.g. close_contract's "Contract not found").
+    """
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/expenses"
-        + f"?expense_date=gte.{since}&order=expense_date.desc"
-    )
+    if r.status_code != 404:
+        return False
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
+    try:
+        return r.json().get("code") == "PGRST202"
+    except ValueError:
+        return True
 
-    r.raise_for_status()
 
-    return r.json()
+def rpc_error(r) -> str:
 
-def fetch_all_expenses():
+    try:
+        return r.json().get("message") or r.text
+    except ValueError:
+        return r.text
 
-    url = SUPABASE_URL + "/rest/v1/expenses?order=expense_date.asc"
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
+# ======================================================
+# Payloads
+# ======================================================
 
-    r.raise_for_status()
+def build_contract_payload(data) -> dict:
 
-    return r.json()
+    start = datetime.strptime(data["START_DATE"], "%d.%m.%Y")
+    end = datetime.strptime(data["END_DATE"], "%d.%m.%Y")
 
+    nights = (end - start).days
+    contract_code = build_contract_code(
+        data["START_DATE"],
+        data["FLAT_NUMBER"],
+    )
+    data["CONTRACT_CODE"] = contract_code
 
+    return {
+        "contract_code": contract_code,
+        "flat_number": data.get("FLAT_NUMBER"),
 
-def insert_fixed_expense(payload: dict):
+        "client_name": data.get("CLIENT_NAME"),
+        "client_id": data.get("CLIENT_ID"),
+        "client_address": data.get("CLIENT_ADDRESS"),
+        "client_mail": data.get("CLIENT_MAIL"),
+        "client_number": data.get("CLIENT_NUMBER"),
 
-    url = SUPABASE_URL + "/rest/v1/fixed_expenses"
+        "start_date": start.strftime("%Y-%m-%d"),
+        "end_date": end.strftime("%Y-%m-%d"),
+        "nights": nights,
 
-    r = requests.post(
-        url,
-        json=payload,
-        headers=HEADERS,
-        timeout=10,
-    )
+        "max_people_day": int(data["MAX_PEOPLE_DAY"]),
+        "max_people_night": int(data["MAX_PEOPLE_NIGHT"]),
+        
+        "price_per_day": int(data["PRICE_PER_DAY"]),
+        "total_price": int(data["TOTAL_PRICE"]),
+        "deposit": int(data["DEPOSIT"]),
 
-    print("🟡 FIXED EXPENSE INSERT:", r.status_code, r.text)
+        "checkout_time": data["CHECKOUT_TIME"],
+        "is_closed": False,
 
-    r.raise_for_status()
+        "payment_method": data.get("PAYMENT_METHOD"),
+        "invoice_issued": data.get("INVOICE_ISSUED"),
+        "invoice_number": data.get("INVOICE_NUMBER"),
+        "fixed_per_booking": round(
+            float(data.get("FIXED_PER_BOOKING", 10)),
+            2,
+        ),
+    }
 
 
-async def expense_payment_chosen(update, context):
+# ======================================================
+# Close contract full logic (with early checkout + act)
+# ======================================================
 
-    query = update.callback_query
-    await query.answer()
+def build_close_payload(
+    result: Settlement,
+    actual_checkout_date: date,
+    early_checkout: bool,
+    initiator: str | None,
+    early_reason: str | None,
+) -> dict:
 
-    method = "company" if query.data == "EXP_PAY_COMPANY" else "cash"
+    return {
+        "actual_checkout_date": actual_checkout_date.isoformat(),
+        "early_checkout": early_checkout,
+        "early_initiator": initiator,
+        "early_reason": early_reason,
 
-    exp = context.user_data["expense"]
+        "refund_unused_amount": result.unused,
+        "final_refund_amount": result.refund,
+        "extra_due_amount": result.extra_due,
 
-    payload = {
-        "amount": exp["amount"],
-        "date": exp["date"],
-        "category": exp["category"],
-        "payment_method": method,
+        "is_closed": True,
     }
 
-    insert_expense(payload)
 
-    await query.edit_message_text("✅ Расход сохранён.")
-
-    await query.message.reply_text(
-        "Главное меню:",
-        reply_markup=start_keyboard(update.effective_user),
+def build_close_previews(
+    contracts: list,
+    penalties: dict,
+    actual_checkout_date: date,
+    early_checkout: bool,
+    initiator: str | None,
+    manual_refund: int | None,
+) -> dict:
+
+    errors = []
+
+    previews = settle_many(
+        contracts,
+        penalties,
+        actual_checkout_date,
+        early_checkout,
+        initiator,
+        manual_refund,
+        errors=errors,
     )
 
-    context.user_data.pop("expense", None)
+    for c, e in errors:
+        log.error("preview_row_error", exc=e, contract_code=c.get("contract_code"))
 
-    return FlowState.MENU
+    return previews
 
 
 # ======================================================
-# Bookings DB API
+# Async client (shared pooled connection)
 # ======================================================
 
-def insert_booking(payload: dict):
+class SupabaseClient:
+    """
+    Async PostgREST client for the bot handlers.
+
+    One long-lived httpx.AsyncClient per process: keep-alive, HTTP/2
+    when `h2` is installed. This is the only DB API of the bot.
+
+    Reference reads (active contracts, contract by code, open violations,
+    fixed expenses, bookings) go through `self.cache`; every write
+    invalidates the tags of the reads it changes.
+
+    Identical GETs that are in flight at the same time share one request
+    (`self.flights`); each caller decodes its own copy of the body.
+    """
 
-    url = SUPABASE_URL + "/rest/v1/bookings"
+    def __init__(
+        self,
+        url: str = SUPABASE_URL,
+        key: str = SUPABASE_KEY,
+        timeout: float = 10,
+        max_connections: int = 10,
+    ):
+        self.base_url = url.rstrip("/") + "/rest/v1"
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        }
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60,
+        )
+        self._client = None
 
-    r = requests.post(
-        url,
-        json=payload,
-        headers=HEADERS,
-        timeout=10,
-    )
+        # RPCs from db/sql/: None = not tried yet, False once the
+        # function turned out to be missing (fallback path from then on)
+        self.penalties_rpc = None
+        self.close_rpc = None
 
-    print("🟡 BOOKING INSERT:", r.status_code, r.text)
+        # callables(row) given every contract row this client wrote
+        # (finance ledger)
+        self.contract_listeners = []
 
-    r.raise_for_status()
+        self.cache = QueryCache()
+        self.flights = SingleFlight()
 
+    def _http(self) -> httpx.AsyncClient:
 
-def fetch_active_bookings():
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=HTTP2_AVAILABLE,
+            )
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/bookings"
-        + "?status=eq.active"
-        + "&order=flat_number.asc"
-    )
+        return self._client
 
-    r = requests.get(
-        url,
-        headers=HEADERS,
-        timeout=10,
-    )
+    async def aclose(self):
 
-    r.raise_for_status()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-    return r.json()
+    # --------------------------------------------------
 
+    async def _fetch(self, path: str, params=None, headers=None) -> httpx.Response:
 
-def fetch_all_contracts():
+        async def send():
+            r = await self._http().get(path, params=params, headers=headers)
+            count_response(len(r.content))
+            return r
 
-    url = (
-        f"{SUPABASE_URL}/rest/v1/contracts"
-        f"?select=*"
-        f"&order=start_date.desc"
-    )
+        key = (
+            path,
+            tuple(params or ()),
+            tuple(sorted((headers or {}).items())),
+        )
 
-    print("📡 FETCH ALL URL:", url)
+        return await self.flights.do(key, send)
 
-    r = requests.get(
-        url,
-        headers=HEADERS,
-        timeout=10,
-    )
+    async def _get(self, path: str, params=None):
 
-    print("📡 STATUS:", r.status_code)
-    print("📡 BODY:", r.text)
+        r = await self._fetch(path, params)
+        r.raise_for_status()
 
-    r.raise_for_status()
+        return r.json()
 
-    return r.json()
+    async def _iter_pages(self, path: str, params: list, column: str, desc: bool, page_size: int):
+        """
+        Keyset paging on (column, id): every page starts after the last
+        row of the previous one, so rows inserted meanwhile don't shift
+        the pages and deep pages cost no OFFSET scan.
 
+        Only an empty page ends it — a short one may just be capped by
+        PostgREST max-rows.
+        """
 
-def fetch_active_contracts():
-    today = date.today().isoformat()
+        direction = "desc" if desc else "asc"
 
-    r = requests.get(
-        f"{SUPABASE_URL}/rest/v1/contracts"
-        f"?is_closed=eq.false"
-        f"&start_date=lte.{today}"
-        f"&end_date=gte.{today}",
-        headers=HEADERS,
-        timeout=10,
-    )
+        params = params + [
+            ("order", f"{column}.{direction},id.{direction}"),
+            ("limit", str(page_size)),
+        ]
 
-    r.raise_for_status()
-    return r.json()
+        after = []
 
+        while True:
 
-def save_contract_to_db(data, files):
+            r = await self._fetch(path, params + after)
+            r.raise_for_status()
 
-    url = os.environ["SUPABASE_URL"] + "/rest/v1/contracts"
+            rows = r.json()
 
-    headers = {
-        "apikey": os.environ["SUPABASE_KEY"],
-        "Authorization": f"Bearer {os.environ['SUPABASE_KEY']}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal",
-    }
+            if not rows:
+                return
 
-    start = datetime.strptime(data["START_DATE"], "%d.%m.%Y")
-    end = datetime.strptime(data["END_DATE"], "%d.%m.%Y")
+            for row in rows:
+                yield row
 
-    nights = (end - start).days
-    contract_code = build_contract_code(
-        data["START_DATE"],
-        data["FLAT_NUMBER"],
-    )
-    data["CONTRACT_CODE"] = contract_code
+            after = keyset_after(rows[-1], column, desc)
 
-    payload = {
-        "contract_code": contract_code,
-        "flat_number": data.get("FLAT_NUMBER"),
+    async def _post(self, path: str, payload: dict, headers=None):
 
-        "client_name": data.get("CLIENT_NAME"),
-        "client_id": data.get("CLIENT_ID"),
-        "client_address": data.get("CLIENT_ADDRESS"),
-        "client_mail": data.get("CLIENT_MAIL"),
-        "client_number": data.get("CLIENT_NUMBER"),
+        try:
+            r = await self._http().post(path, json=payload, headers=headers)
+        finally:
+            self.flights.forget()
 
-        "start_date": start.strftime("%Y-%m-%d"),
-        "end_date": end.strftime("%Y-%m-%d"),
-        "nights": nights,
+        count_response(len(r.content))
 
-        "max_people_day": int(data["MAX_PEOPLE_DAY"]),
-        "max_people_night": int(data["MAX_PEOPLE_NIGHT"]),
-        
-        "price_per_day": int(data["PRICE_PER_DAY"]),
-        "total_price": int(data["TOTAL_PRICE"]),
-        "deposit": int(data["DEPOSIT"]),
+        return r
 
-        "checkout_time": data["CHECKOUT_TIME"],
-        "is_closed": False,
+    async def _patch(self, path: str, params, payload: dict, headers=None):
 
-        "payment_method": data.get("PAYMENT_METHOD"),
-        "invoice_issued": data.get("INVOICE_ISSUED"),
-        "invoice_number": data.get("INVOICE_NUMBER"),
-        "fixed_per_booking": round(
-            float(data.get("FIXED_PER_BOOKING", 10)),
-            2,
-        ),
-    }
+        try:
+            r = await self._http().patch(
+                path,
+                params=params,
+                json=payload,
+                headers=headers,
+            )
+        finally:
+            self.flights.forget()
 
-    r = requests.post(url, json=payload, headers=headers, timeout=10)
+        count_response(len(r.content))
 
-    print("🟡 Supabase INSERT status:", r.status_code)
-    print("🟡 Supabase INSERT body:", r.text)
-    
-    if r.status_code not in (200, 201):
-        raise RuntimeError("Supabase insert failed")
+        return r
 
-def get_contract_by_code(contract_code: str):
+    async def _delete(self, path: str, params):
 
-    url = (
-        SUPABASE_URL
-        + f"/rest/v1/contracts?contract_code=eq.{contract_code}&select=*"
-    )
+        try:
+            r = await self._http().delete(path, params=params)
+        finally:
+            self.flights.forget()
 
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-    }
+        count_response(len(r.content))
 
-    r = requests.get(url, headers=headers, timeout=10)
-    r.raise_for_status()
+        return r
 
-    rows = r.json()
+    def _contract_changed(self, row: dict):
 
-    if not rows:
-        return None
+        for listener in self.contract_listeners:
+            listener(row)
 
-    return rows[0]
+    # ==================================================
+    # Expenses
+    # ==================================================
 
-# ======================================================
-# Close contract full logic (with early checkout + act)
-# ======================================================
+    async def insert_expense(self, payload):
 
-def calculate_close_preview(
-    contract_code: str,
-    actual_checkout_date: date,
-    early_checkout: bool,
-    initiator: str | None,
-    early_reason: str | None,
-    manual_refund: int | None,
-):
-
-    contract = get_contract_by_code(contract_code)
-
-    violations = fetch_contract_violations(contract_code)
-    penalties = sum(int(v["amount"]) for v in violations)
+        try:
+            r = await self._post("/expenses", payload)
+        finally:
+            # nothing cached reads expenses; this only tells the reports
+            self.cache.invalidate("expenses")
 
-    start = datetime.fromisoformat(contract["start_date"]).date()
-    actual_end = actual_checkout_date
+        log_response("expense_insert", r)
 
-    lived_nights = max(0, (actual_end - start).days)
+        r.raise_for_status()
 
-    price = int(contract["price_per_day"])
-    total_price = int(contract["total_price"])
-    deposit = int(contract["deposit"])
+    async def fetch_expenses_by_month(self, year: str, month: str):
 
-    used_amount = lived_nights * price
-    unused_amount = max(0, total_price - used_amount)
+        start = f"{year}-{month}-01"
 
-    refund = 0
-    extra_due = 0
+        if month == "12":
+            end = f"{int(year)+1}-01-01"
+        else:
+            end = f"{year}-{int(month)+1:02}-01"
 
-    if not early_checkout:
+        return await self._get("/expenses", [
+            ("expense_date", f"gte.{start}"),
+            ("expense_date", f"lt.{end}"),
+            ("order", "expense_date.asc"),
+        ])
 
-        refund = max(0, deposit - penalties)
-        extra_due = max(0, penalties - deposit)
+    async def fetch_expenses_last_30_days(self):
 
-    else:
+        since = (date.today() - timedelta(days=30)).isoformat()
 
-        if initiator == "tenant":
+        return await self._get("/expenses", [
+            ("expense_date", f"gte.{since}"),
+            ("order", "expense_date.desc"),
+        ])
 
-            refund = unused_amount + max(0, deposit - penalties)
-            extra_due = max(0, penalties - deposit)
+    def iter_all_expenses(self, page_size: int = PAGE_SIZE):
 
-        elif initiator == "landlord":
+        return self._iter_pages(
+            "/expenses",
+            [],
+            "expense_date",
+            False,
+            page_size,
+        )
 
-            if manual_refund is not None:
-                refund = manual_refund
+    async def fetch_all_expenses(self):
+        return [r async for r in self.iter_all_expenses()]
 
-                total_available = deposit + unused_amount
-                extra_due = max(0, penalties - total_available + refund)
+    # ==================================================
+    # Fixed expenses
+    # ==================================================
 
-            else:
-                refund = unused_amount + max(0, deposit - penalties)
-                extra_due = max(0, penalties - (deposit + unused_amount))
+    async def fetch_fixed_expense_by_id(self, fid):
 
-    return {
-        "used": used_amount,
-        "unused": unused_amount,
-        "penalties": penalties,
-        "refund": refund,
-        "extra_due": extra_due,
-        "lived_nights": lived_nights,
-        "unused_nights": max(0, contract["nights"] - lived_nights),
-    }
+        async def load():
+            rows = await self._get("/fixed_expenses", [("id", f"eq.{fid}")])
+            return rows[0] if rows else None
 
+        return await self.cache.get_or_load(
+            ("fixed_expense", str(fid)),
+            load,
+            tags=[f"fixed_expense:{fid}"],
+        )
 
-def close_contract_full(
-    contract_code: str,
-    actual_checkout_date: date,
-    early_checkout: bool,
-    initiator: str | None,
-    early_reason: str | None,
-    manual_refund: int | None,
-):
-
-    contract = get_contract_by_code(contract_code)
+    async def delete_fixed_expense(self, fid):
 
-    if not contract:
-        raise ValueError("Contract not found")
+        try:
+            r = await self._delete("/fixed_expenses", [("id", f"eq.{fid}")])
+        finally:
+            self.cache.invalidate("fixed_expenses", f"fixed_expense:{fid}")
 
-    if contract["is_closed"]:
-        raise ValueError("Contract already closed")
+        r.raise_for_status()
 
-    # --- violations ---
-    violations = fetch_contract_violations(contract_code)
-    penalties = sum(int(v["amount"]) for v in violations)
+    async def update_fixed_expense(self, fid, payload):
 
-    # --- dates ---
-    start = datetime.fromisoformat(contract["start_date"]).date()
-    actual_end = actual_checkout_date
+        try:
+            r = await self._patch(
+                "/fixed_expenses",
+                [("id", f"eq.{fid}")],
+                payload,
+                headers={"Prefer": "return=minimal"},
+            )
+        finally:
+            self.cache.invalidate("fixed_expenses", f"fixed_expense:{fid}")
 
-    lived_nights = max(0, (actual_end - start).days)
+        r.raise_for_status()
 
-    price = int(contract["price_per_day"])
-    total_price = int(contract["total_price"])
-    deposit = int(contract["deposit"])
+    async def fetch_fixed_expenses(self):
 
-    used_amount = lived_nights * price
-    unused_amount = max(0, total_price - used_amount)
+        async def load():
+            rows = await self._get("/fixed_expenses", [("order", "id.asc")])
+            log.debug("fetch_fixed", rows=len(rows))
+            return rows
 
-    # --- default calculations ---
-    refund = 0
-    extra_due = 0
+        return await self.cache.get_or_load(
+            ("fixed_expenses",),
+            load,
+            tags=["fixed_expenses"],
+        )
 
-    # =============================
-    # NORMAL END
-    # =============================
-    if not early_checkout:
+    async def insert_fixed_expense(self, payload: dict):
 
-        refund = max(0, deposit - penalties)
-        extra_due = max(0, penalties - deposit)
+        try:
+            r = await self._post("/fixed_expenses", payload)
+        finally:
+            self.cache.invalidate("fixed_expenses")
 
-    # =============================
-    # EARLY CHECKOUT
-    # =============================
-    else:
+        log_response("fixed_expense_insert", r)
 
-        # ---- tenant initiated ----
-        if initiator == "tenant":
+        r.raise_for_status()
 
-            refund = unused_amount + max(0, deposit - penalties)
-            extra_due = max(0, penalties - deposit)
+    # ==================================================
+    # Bookings
+    # ==================================================
 
-        # ---- landlord initiated ----
-        elif initiator == "landlord":
+    async def insert_booking(self, payload: dict):
 
-            if manual_refund is not None:
-                refund = manual_refund
+        try:
+            r = await self._post("/bookings", payload)
+        finally:
+            self.cache.invalidate("bookings")
 
-                total_available = deposit + unused_amount
-                extra_due = max(0, penalties - total_available + refund)
+        log_response("booking_insert", r)
 
-            else:
-                refund = unused_amount + max(0, deposit - penalties)
-                extra_due = max(0, penalties - (deposit + unused_amount))
+        r.raise_for_status()
 
-    # --- save to contracts ---
-    url = (
-        SUPABASE_URL
-        + f"/rest/v1/contracts?contract_code=eq.{contract_code}"
-    )
+    async def fetch_active_bookings(self):
 
-    payload = {
-        "actual_checkout_date": actual_checkout_date.isoformat(),
-        "early_checkout": early_checkout,
-        "early_initiator": initiator,
-        "early_reason": early_reason,
+        return await self.cache.get_or_load(
+            ("active_bookings",),
+            lambda: self._get("/bookings", [
+                ("status", "eq.active"),
+                ("order", "flat_number.asc"),
+            ]),
+            tags=["bookings"],
+        )
 
-        "refund_unused_amount": unused_amount,
-        "final_refund_amount": refund,
-        "extra_due_amount": extra_due,
+    # ==================================================
+    # Contracts
+    # ==================================================
 
-        "is_closed": True,
-    }
+    def iter_all_contracts(self, page_size: int = PAGE_SIZE):
 
-    r = requests.patch(
-        url,
-        json=payload,
-        headers=HEADERS,
-        timeout=10,
-    )
+        return self._iter_pages(
+            "/contracts",
+            [("select", "*")],
+            "start_date",
+            True,
+            page_size,
+        )
+
+    async def fetch_all_contracts(self):
+        return [r async for r in self.iter_all_contracts()]
+
+    async def fetch_active_contracts(self):
+
+        today = date.today().isoformat()
+
+        return await self.cache.get_or_load(
+            ("active_contracts", today),
+            lambda: self._get("/contracts", [
+                ("is_closed", "eq.false"),
+                ("start_date", f"lte.{today}"),
+                ("end_date", f"gte.{today}"),
+            ]),
+            tags=["active_contracts"],
+        )
+
+    async def save_contract_to_db(self, data, files):
+
+        payload = build_contract_payload(data)
+
+        try:
+            r = await self._post(
+                "/contracts",
+                payload,
+                headers={"Prefer": "return=representation"},
+            )
+        finally:
+            self.cache.invalidate(
+                "active_contracts",
+                f"contract:{payload['contract_code']}",
+            )
 
-    print("🟡 CLOSE FULL:", r.status_code, r.text)
+        log_response("contract_insert", r)
 
-    r.raise_for_status()
+        if r.status_code not in (200, 201):
+            raise RuntimeError("Supabase insert failed")
 
-    return {
-        "used": used_amount,
-        "unused": unused_amount,
-        "penalties": penalties,
-        "refund": refund,
-        "extra_due": extra_due,
-        "lived_nights": lived_nights,
-    }
+        rows = r.json()
+
+        for row in rows:
+            self._contract_changed(row)
+
+        return rows[0] if rows else None
+
+    async def get_contract_by_code(self, contract_code: str):
+
+        async def load():
 
-# ======================================================
-# Violations DB API
-# ======================================================
+            rows = await self._get("/contracts", [
+                ("contract_code", f"eq.{contract_code}"),
+                ("select", "*"),
+            ])
+
+            return rows[0] if rows else None
+
+        return await self.cache.get_or_load(
+            ("contract", contract_code),
+            load,
+            tags=[f"contract:{contract_code}"],
+        )
+
+    async def calculate_close_preview(
+        self,
+        contract_code: str,
+        actual_checkout_date: date,
+        early_checkout: bool,
+        initiator: str | None,
+        early_reason: str | None,
+        manual_refund: int | None,
+    ):
+
+        contract = await self.get_contract_by_code(contract_code)
+
+        violations = await self.fetch_contract_violations(contract_code)
+        penalties = total_penalties(violations)
+
+        return settle(
+            contract,
+            penalties,
+            actual_checkout_date,
+            early_checkout,
+            initiator,
+            manual_refund,
+        )
+
+    async def close_contract(
+        self,
+        contract_code: str,
+        actual_checkout_date: date,
+        early_checkout: bool,
+        initiator: str | None,
+        early_reason: str | None,
+        manual_refund: int | None,
+    ) -> dict:
+        """
+        Closes the contract and returns {"contract", "violations",
+        "result"}: the closed row, its violations for the stay period
+        and the Settlement, ready for build_checkout_act.
+
+        One call to the close_contract RPC (db/sql/close_contract.sql),
+        which locks the row for the whole computation.
+        """
+
+        if self.close_rpc is not False:
+
+            try:
+                r = await self._post("/rpc/close_contract", {
+                    "p_contract_code": contract_code,
+                    "p_actual_checkout_date": actual_checkout_date.isoformat(),
+                    "p_early_checkout": bool(early_checkout),
+                    "p_initiator": initiator,
+                    "p_early_reason": early_reason,
+                    "p_manual_refund": manual_refund,
+                })
+            finally:
+                self.cache.invalidate("active_contracts", f"contract:{contract_code}")
+
+            if not rpc_missing(r):
+
+                log_response("close_rpc", r)
+
+                if r.status_code in (404, 409):
+                    raise ValueError(rpc_error(r))
+
+                r.raise_for_status()
+                self.close_rpc = True
+
+                closed = r.json()
+                closed["result"] = Settlement(**closed["result"])
+
+                self._contract_changed(closed["contract"])
+
+                return closed
+
+            log.warning("rpc_missing", rpc="close_contract", fallback="PATCH")
+            self.close_rpc = False
+
+        closed = await self._close_contract_patch(
+            contract_code,
+            actual_checkout_date,
+            early_checkout,
+            initiator,
+            early_reason,
+            manual_refund,
+        )
+
+        self._contract_changed(closed["contract"])
+
+        return closed
+
+    async def _close_contract_patch(
+        self,
+        contract_code: str,
+        actual_checkout_date: date,
+        early_checkout: bool,
+        initiator: str | None,
+        early_reason: str | None,
+        manual_refund: int | None,
+    ) -> dict:
+
+        contract = await self.get_contract_by_code(contract_code)
+
+        if not contract:
+            raise ValueError("Contract not found")
+
+        if contract["is_closed"]:
+            raise ValueError("Contract already closed")
+
+        violations = await self.fetch_contract_violations(contract_code)
+        penalties = total_penalties(violations)
+
+        result = settle(
+            contract,
+            penalties,
+            actual_checkout_date,
+            early_checkout,
+            initiator,
+            manual_refund,
+        )
+
+        payload = build_close_payload(
+            result,
+            actual_checkout_date,
+            early_checkout,
+            initiator,
+            early_reason,
+        )
+
+        # is_closed=eq.false: a concurrent close leaves nothing to update
+        try:
+            r = await self._patch(
+                "/contracts",
+                [
+                    ("contract_code", f"eq.{contract_code}"),
+                    ("is_closed", "eq.false"),
+                ],
+                payload,
+                headers={"Prefer": "return=representation"},
+            )
+        finally:
+            self.cache.invalidate("active_contracts", f"contract:{contract_code}")
+
+        log_response("close_full", r)
+
+        r.raise_for_status()
+
+        rows = r.json()
+
+        if not rows:
+            raise ValueError("Contract already closed")
+
+        contract = rows[0]
+
+        return {
+            "contract": contract,
+            "violations": await self.fetch_contract_violations_for_period(
+                contract_code=contract_code,
+                start_date=contract["start_date"],
+                actual_end_date=contract["actual_checkout_date"],
+            ),
+            "result": result,
+        }
+
+    async def close_contract_full(
+        self,
+        contract_code: str,
+        actual_checkout_date: date,
+        early_checkout: bool,
+        initiator: str | None,
+        early_reason: str | None,
+        manual_refund: int | None,
+    ):
+
+        closed = await self.close_contract(
+            contract_code,
+            actual_checkout_date,
+            early_checkout,
+            initiator,
+            early_reason,
+            manual_refund,
+        )
+
+        return closed["result"]
+
+    async def calculate_close_previews(
+        self,
+        contracts: list,
+        actual_checkout_date: date,
+        early_checkout: bool,
+        initiator: str | None,
+        manual_refund: int | None,
+    ) -> dict:
+        """
+        Previews for already fetched contracts with one violations read,
+        as long as their codes fit one in.() filter (~250, see
+        in_chunks); past that, one more read per chunk.
+        """
+
+        codes = [c["contract_code"] for c in contracts]
+        violations = await self.fetch_open_violations_by_codes(codes)
+
+        return build_close_previews(
+            contracts,
+            penalties_by_code(violations),
+            actual_checkout_date,
+            early_checkout,
+            initiator,
+            manual_refund,
+        )
+
+    # ==================================================
+    # Violations
+    # ==================================================
+
+    async def insert_violation(self, payload: dict):
+
+        try:
+            r = await self._post("/violations", payload)
+        finally:
+            self.cache.invalidate(
+                f"violations:{payload.get('contract_code')}",
+                f"flat_violations:{payload.get('flat_number')}",
+            )
+
+        log_response("violation_insert", r)
+
+        r.raise_for_status()
+
+    async def fetch_contract_violations(self, contract_code: str):
+
+        return await self.cache.get_or_load(
+            ("contract_violations", contract_code),
+            lambda: self._get("/violations", [
+                ("contract_code", f"eq.{contract_code}"),
+                ("resolved", "eq.false"),
+            ]),
+            tags=["violations", f"violations:{contract_code}"],
+        )
 
-def insert_violation(payload: dict):
+    async def fetch_open_violations_by_codes(self, codes: list[str]):
 
-    url = SUPABASE_URL + "/rest/v1/violations"
+        rows = []
 
-    r = requests.post(
-        url,
-        json=payload,
-        headers=HEADERS,
-        timeout=10,
-    )
+        for chunk in in_chunks(codes):
+            rows.extend(await self._get("/violations", [
+                ("contract_code", in_list(chunk)),
+                ("resolved", "eq.false"),
+            ]))
+
+        return rows
 
-    print("🟡 VIOLATION INSERT:", r.status_code, r.text)
+    async def fetch_flat_violations(self, flat_number: str):
+
+        return await self.cache.get_or_load(
+            ("flat_violations", str(flat_number)),
+            lambda: self._get("/violations", [
+                ("flat_number", f"eq.{flat_number}"),
+                ("resolved", "eq.false"),
+            ]),
+            tags=["violations", f"flat_violations:{flat_number}"],
+        )
 
-    r.raise_for_status()
+    async def delete_violation(self, violation_id: str):
 
+        # the id alone doesn't say which contract/flat it belonged to
+        try:
+            r = await self._delete("/violations", [("id", f"eq.{violation_id}")])
+        finally:
+            self.cache.invalidate("violations")
 
-def fetch_contract_violations(contract_code: str):
+        log_response("violation_delete", r)
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/violations"
-        + f"?contract_code=eq.{contract_code}"
-        + "&resolved=eq.false"
-    )
+        r.raise_for_status()
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
-    r.raise_for_status()
+    async def fetch_violations_between(self, start_date: str, end_date: str):
 
-    return r.json()
+        return await self._get("/violations", [
+            ("created_at", f"gte.{start_date}"),
+            ("created_at", f"lte.{end_date}"),
+        ])
 
+    async def fetch_contract_violations_for_period(
+        self,
+        contract_code: str,
+        start_date: str,
+        actual_end_date: str,
+    ):
 
-def fetch_flat_violations(flat_number: str):
+        rows = await self._get("/violations", [
+            ("contract_code", f"eq.{contract_code}"),
+            ("created_at", f"gte.{start_date}"),
+            ("created_at", f"lte.{actual_end_date}"),
+        ])
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/violations"
-        + f"?flat_number=eq.{flat_number}"
-        + "&resolved=eq.false"
-    )
+        log.debug("fetch_period_violations", rows=len(rows))
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
-    r.raise_for_status()
+        return rows
 
-    return r.json()
+    async def fetch_penalties_by_contract_codes(self, codes: list[str]):
 
+        codes = list(dict.fromkeys(c for c in codes if c))
 
-def delete_violation(violation_id: str):
+        if not codes:
+            return {}
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/violations"
-        + f"?id=eq.{violation_id}"
-    )
+        if self.penalties_rpc is not False:
 
-    r = requests.delete(url, headers=HEADERS, timeout=10)
+            r = await self._post("/rpc/contract_penalties", {"codes": codes})
 
-    print("🟡 VIOLATION DELETE:", r.status_code, r.text)
+            if not rpc_missing(r):
+                r.raise_for_status()
+                self.penalties_rpc = True
+                return penalties_from_rpc(r.json())
 
-    r.raise_for_status()
+            log.warning("rpc_missing", rpc="contract_penalties", fallback="chunked reads")
+            self.penalties_rpc = False
 
+        penalties = {}
 
-def fetch_violations_between(start_date: str, end_date: str):
+        for chunk in in_chunks(codes):
 
-    url = (
-        SUPABASE_URL
-        + "/rest/v1/violations"
-        + f"?created_at=gte.{start_date}"
-        + f"&created_at=lte.{end_date}"
-    )
+            rows = await self._get("/violations", [
+                ("select", "contract_code,amount"),
+                ("contract_code", in_list(chunk)),
+            ])
 
-    r = requests.get(url, headers=HEADERS, timeout=10)
-    r.raise_for_status()
+            penalties_by_code(rows, penalties)
 
-    return r.json()
+        return penalties
 
 
+supabase = SupabaseClient()
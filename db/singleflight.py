@@ -0,0 +1,57 @@
+import asyncio
+
+
+# ======================================================
+# Coalescing of identical in-flight reads
+# ======================================================
+
+class SingleFlight:
+    """
+    While a call for `key` is running, later callers with the same key
+    await it instead of starting their own; all of them get its result
+    (or its exception).
+
+    The call runs in its own task, so a caller that gets cancelled
+    doesn't cancel it for the others.
+
+    forget() detaches every running call: callers that arrive after it
+    start a fresh one. Writes call it, so a read issued after a write
+    never joins a request that was sent before it.
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> asyncio.Task
+
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, fn):
+
+        task = self._calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+
+            self._calls[key] = task
+            self.started += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
+
+    def _done(self, key, task: asyncio.Task):
+
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+        # все ожидавшие могли быть отменены — без этого asyncio ругается
+        # "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def forget(self):
+        self._calls.clear()
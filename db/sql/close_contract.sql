@@ -0,0 +1,125 @@
+-- Closes a contract in one transaction and returns everything the
+-- checkout act needs:
+--
+--   {"contract": <closed row>, "violations": [<period violations>],
+--    "result": {used, unused, penalties, refund, extra_due, lived_nights,
+--               unused_nights}}
+--
+-- The contract row is locked (FOR UPDATE), so two admins closing the same
+-- contract can't both succeed: the second one gets 409 "Contract already
+-- closed". The refund math mirrors core/settlement.settle; keep them in
+-- sync.
+
+create or replace function public.close_contract(
+    p_contract_code text,
+    p_actual_checkout_date date,
+    p_early_checkout boolean,
+    p_initiator text default null,
+    p_early_reason text default null,
+    p_manual_refund integer default null
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    c public.contracts%rowtype;
+
+    lived_nights integer;
+    price integer;
+    total_price integer;
+    deposit integer;
+
+    used_amount integer;
+    unused_amount integer;
+    penalties integer;
+    refund integer := 0;
+    extra_due integer := 0;
+
+    violations jsonb;
+begin
+    select * into c
+    from public.contracts
+    where contract_code = p_contract_code
+    for update;
+
+    if not found then
+        raise exception 'Contract not found' using errcode = 'PT404';
+    end if;
+
+    if c.is_closed then
+        raise exception 'Contract already closed' using errcode = 'PT409';
+    end if;
+
+    select coalesce(sum(v.amount), 0)::integer into penalties
+    from public.violations v
+    where v.contract_code = p_contract_code
+      and v.resolved = false;
+
+    lived_nights := greatest(0, p_actual_checkout_date - c.start_date::date);
+
+    price := trunc(c.price_per_day)::integer;
+    total_price := trunc(c.total_price)::integer;
+    deposit := trunc(c.deposit)::integer;
+
+    used_amount := lived_nights * price;
+    unused_amount := greatest(0, total_price - used_amount);
+
+    if not p_early_checkout then
+
+        refund := greatest(0, deposit - penalties);
+        extra_due := greatest(0, penalties - deposit);
+
+    elsif p_initiator = 'tenant' then
+
+        refund := unused_amount + greatest(0, deposit - penalties);
+        extra_due := greatest(0, penalties - deposit);
+
+    elsif p_initiator = 'landlord' then
+
+        if p_manual_refund is not null then
+            refund := p_manual_refund;
+            extra_due := greatest(0, penalties - (deposit + unused_amount) + refund);
+        else
+            refund := unused_amount + greatest(0, deposit - penalties);
+            extra_due := greatest(0, penalties - (deposit + unused_amount));
+        end if;
+
+    end if;
+
+    update public.contracts set
+        actual_checkout_date = p_actual_checkout_date,
+        early_checkout = p_early_checkout,
+        early_initiator = p_initiator,
+        early_reason = p_early_reason,
+        refund_unused_amount = unused_amount,
+        final_refund_amount = refund,
+        extra_due_amount = extra_due,
+        is_closed = true
+    where contract_code = p_contract_code
+    returning * into c;
+
+    select coalesce(jsonb_agg(to_jsonb(v) order by v.created_at), '[]'::jsonb)
+    into violations
+    from public.violations v
+    where v.contract_code = p_contract_code
+      and v.created_at >= c.start_date::timestamptz
+      and v.created_at <= c.actual_checkout_date::timestamptz;
+
+    return jsonb_build_object(
+        'contract', to_jsonb(c),
+        'violations', violations,
+        'result', jsonb_build_object(
+            'used', used_amount,
+            'unused', unused_amount,
+            'penalties', penalties,
+            'refund', refund,
+            'extra_due', extra_due,
+            'lived_nights', lived_nights,
+            'unused_nights', greatest(0, coalesce(c.nights, 0) - lived_nights)
+        )
+    );
+end;
+$$;
+
+grant execute on function public.close_contract(text, date, boolean, text, text, integer)
+    to anon, authenticated, service_role;
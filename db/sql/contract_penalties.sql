@@ -0,0 +1,18 @@
+-- Penalty totals per contract, for stats / close previews.
+--
+-- Called as POST /rest/v1/rpc/contract_penalties {"codes": [...]}; codes
+-- travel in the body, so the request size doesn't depend on the URL limit.
+-- codes = null returns every contract that has violations.
+
+create or replace function public.contract_penalties(codes text[] default null)
+returns table (contract_code text, total bigint)
+language sql
+stable
+as $$
+    select v.contract_code, sum(v.amount)::bigint as total
+    from public.violations v
+    where codes is null or v.contract_code = any (codes)
+    group by v.contract_code
+$$;
+
+grant execute on function public.contract_penalties(text[]) to anon, authenticated, service_role;
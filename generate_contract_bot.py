@@ -1,59 +1,54 @@
+import asyncio
+import math
 import os
-from docx import Document
+import time
 import http.server
 import socketserver
 from core.security import access_guard, get_user_role
 from core.constants import FIELDS, QUESTIONS, FlowState
-from core.constants import CONTRACT_TEMPLATE, ACT_TEMPLATE, CHECKOUT_ACT_TEMPLATE, EXPENSE_CATEGORIES
-from core.checkout_act import build_checkout_act
-from reports.excel import build_stats_excel
-from reports.finance import build_finance_report
-from reports.expenses import build_expenses_report
-from db.client import (
-    fetch_all_contracts,
-    fetch_active_contracts,
-    save_contract_to_db,
-    get_contract_by_code,
-    insert_violation,
-    fetch_contract_violations,
-    calculate_close_preview,
-    delete_violation,
-    close_contract_full,
-    insert_booking,
-    fetch_active_bookings,
-    insert_fixed_expense,
-    insert_expense,
-    fetch_fixed_expenses,
-    fetch_expenses_last_30_days,
-    fetch_fixed_expense_by_id,
-    delete_fixed_expense,
-    update_fixed_expense,
-    fetch_expenses_by_month,
-    fetch_contract_violations_for_period,
-    fetch_penalties_by_contract_codes,
-    fetch_all_expenses,
-)
+from core.constants import CHECKOUT_ACT_TEMPLATE, EXPENSE_CATEGORIES
+from core.lazy import lazy
+from core.workers import render_pool, RenderTimeout, RENDER_PREWARM
+from core.persistence import SQLitePersistence
+from core.precompute import precomputed
+from core.file_cache import content_key, file_ids
+from core.log import get_logger, setup_logging
+from core.metrics import metrics, instrument_client, instrument_conversation
+from core.profiling import profiler, PROFILE_UPDATES
+from core.webhook import serve_webhook
+from reports.finance_ledger import finance_ledger
+from db.client import supabase
 from telegram.ext import ApplicationBuilder
 from telegram import Update
 from telegram import ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
     ApplicationBuilder,
+    ApplicationHandlerStop,
     CommandHandler,
     MessageHandler,
     ConversationHandler,
     ContextTypes,
+    PersistenceInput,
+    TypeHandler,
     filters,
 )
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackQueryHandler
 from datetime import date, timedelta, datetime
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 
 
 TOKEN = os.environ["BOT_TOKEN"]
 
+# python-docx / openpyxl грузятся только в воркерах RenderPool: боту
+# они не нужны, а холодный старт на Render ждёт каждую миллисекунду
+generate_docs = lazy("core.documents:generate_docs")
+build_checkout_act = lazy("core.checkout_act:build_checkout_act")
+build_stats_excel = lazy("reports.excel:build_stats_excel")
+write_finance_report = lazy("reports.finance:write_finance_report")
+build_expenses_report = lazy("reports.expenses:build_expenses_report")
+
+log = get_logger("bot")
+
 # ===== Word replacement =====
 
 async def date_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -186,19 +181,39 @@ async def back_to_fixed_menu(update, context):
 
     return await show_fixed_expenses_menu(update, context)
 
+async def build_expenses_artefact() -> dict:
+
+    rows = await supabase.fetch_all_expenses()
+
+    return await build_report_artefact(
+        "expenses",
+        (rows,),
+        build_expenses_report,
+        rows,
+    )
+
+
 async def stats_expenses_callback(update, context):
 
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_all_expenses()
+    art = precomputed.get("expenses")
+
+    if art is None:
 
-    await query.edit_message_text("📊 Формирую отчёт по расходам...")
+        await query.edit_message_text("📊 Формирую отчёт по расходам...")
 
-    path = build_expenses_report(rows)
+        try:
+            art = await precomputed.refresh("expenses")
+        except RenderTimeout:
+            await query.message.reply_text(
+                "⚠️ Отчёт формируется слишком долго, попробуйте позже.",
+                reply_markup=start_keyboard(update.effective_user),
+            )
+            return FlowState.MENU
 
-    with open(path, "rb") as f:
-        await query.message.reply_document(f)
+    await send_artefact(query, art)
 
     await query.message.reply_text(
         "Главное меню:",
@@ -220,7 +235,7 @@ async def fixed_expense_list(update, context):
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_fixed_expenses()
+    rows = await supabase.fetch_fixed_expenses()
 
     if not rows:
         await query.edit_message_text(
@@ -296,7 +311,7 @@ async def fixed_expense_edit_select(update, context):
 
     fid = int(txt)
 
-    row = fetch_fixed_expense_by_id(fid)
+    row = await supabase.fetch_fixed_expense_by_id(fid)
 
     if not row:
         await update.message.reply_text("❌ Расход не найден.")
@@ -349,7 +364,7 @@ async def fixed_expense_edit_price(update, context):
         "total_price": total,
     }
 
-    update_fixed_expense(fe["id"], payload)
+    await supabase.update_fixed_expense(fe["id"], payload)
 
     await update.message.reply_text("✅ Регулярный расход обновлён.")
 
@@ -420,10 +435,10 @@ async def fixed_expense_price_enter(update, context):
     mode = context.user_data.get("fixed_mode")
 
     if mode == "edit":
-        update_fixed_expense(fe["id"], payload)
+        await supabase.update_fixed_expense(fe["id"], payload)
         msg = "✏️ Регулярный расход обновлён."
     else:
-        insert_fixed_expense(payload)
+        await supabase.insert_fixed_expense(payload)
         msg = "✅ Регулярный расход сохранён."
 
     await update.message.reply_text(
@@ -522,7 +537,7 @@ async def expenses_month_show(update, context):
 
     year, month = ym.split("-")
 
-    rows = fetch_expenses_by_month(year, month)
+    rows = await supabase.fetch_expenses_by_month(year, month)
 
     if not rows:
         await query.edit_message_text(
@@ -589,7 +604,7 @@ async def fixed_expense_delete_enter(update, context):
 
     fid = int(txt)
 
-    row = fetch_fixed_expense_by_id(fid)
+    row = await supabase.fetch_fixed_expense_by_id(fid)
 
     if not row:
         await update.message.reply_text("❌ Расход с таким ID не найден.")
@@ -623,7 +638,7 @@ async def fixed_expense_delete_confirm(update, context):
     if not row:
         return await show_fixed_expenses_menu(update, context)
 
-    delete_fixed_expense(row["id"])
+    await supabase.delete_fixed_expense(row["id"])
 
     await query.edit_message_text("🗑 Регулярный расход удалён.")
 
@@ -645,7 +660,7 @@ async def expenses_last30_list(update, context):
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_expenses_last_30_days()
+    rows = await supabase.fetch_expenses_last_30_days()
 
     rows = sorted(
         rows,
@@ -735,7 +750,7 @@ async def expense_payment_chosen(update, context):
         "comment": None,
     }
 
-    insert_expense(payload)
+    await supabase.insert_expense(payload)
 
     await query.edit_message_text("✅ Расход сохранён.")
 
@@ -1041,7 +1056,7 @@ async def booking_finish(update, context):
         payload["nights"] = nights
         payload["total_price"] = total
 
-    insert_booking(payload)
+    await supabase.insert_booking(payload)
 
     start_txt = start.strftime("%d.%m.%Y")
     end_txt = end.strftime("%d.%m.%Y") if end else "❓"
@@ -1078,7 +1093,7 @@ async def booking_list_callback(update, context):
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_active_bookings()
+    rows = await supabase.fetch_active_bookings()
 
     today = date.today()
 
@@ -1147,67 +1162,6 @@ async def booking_list_callback(update, context):
 
     return FlowState.MENU
 
-def replace_everywhere(doc, data):
-    for p in doc.paragraphs:
-        process_paragraph(p, data)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    process_paragraph(p, data)
-
-
-def process_paragraph(p, data):
-    text = p.text
-    keys_used = [k for k in data if f"{{{{{k}}}}}" in text]
-
-    if not keys_used:
-        return
-
-    for r in p.runs:
-        r.text = ""
-
-    i = 0
-    while i < len(text):
-        replaced = False
-        for k in keys_used:
-            ph = f"{{{{{k}}}}}"
-            if text.startswith(ph, i):
-                run = p.add_run(data[k])
-                run.bold = True
-                i += len(ph)
-                replaced = True
-                break
-
-        if not replaced:
-            run = p.add_run(text[i])
-            i += 1
-
-
-def add_page_numbers(doc):
-
-    section = doc.sections[0]
-    footer = section.footer
-
-    p = footer.paragraphs[0] if footer.paragraphs else footer.add_paragraph()
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    run = p.add_run()
-
-    fldChar1 = OxmlElement('w:fldChar')
-    fldChar1.set(qn('w:fldCharType'), 'begin')
-
-    instrText = OxmlElement('w:instrText')
-    instrText.text = "PAGE"
-
-    fldChar2 = OxmlElement('w:fldChar')
-    fldChar2.set(qn('w:fldCharType'), 'end')
-
-    run._r.append(fldChar1)
-    run._r.append(instrText)
-    run._r.append(fldChar2)
-
 # ======================================================
 # Violations flow
 # ======================================================
@@ -1243,7 +1197,7 @@ async def close_show_violations(update, context):
 
     c = context.user_data["edit_contract"]
 
-    violations = fetch_contract_violations(c["contract_code"])
+    violations = await supabase.fetch_contract_violations(c["contract_code"])
 
     if not violations:
         context.user_data["close_total_penalty"] = 0
@@ -1317,7 +1271,7 @@ async def violation_start_callback(update, context):
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_active_contracts()
+    rows = await supabase.fetch_active_contracts()
 
     if not rows:
         await query.edit_message_text(
@@ -1351,7 +1305,7 @@ async def violation_select_flat(update, context):
 
     code = query.data.split(":")[1]
 
-    contract = get_contract_by_code(code)
+    contract = await supabase.get_contract_by_code(code)
 
     context.user_data["violation_contract"] = contract
 
@@ -1434,7 +1388,7 @@ async def violation_confirm(update, context):
         "description": None,
     }
 
-    insert_violation(payload)
+    await supabase.insert_violation(payload)
 
     await query.edit_message_text("✅ Нарушение сохранено.")
 
@@ -1473,7 +1427,7 @@ async def violation_delete_start(update, context):
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_active_contracts()
+    rows = await supabase.fetch_active_contracts()
 
     if not rows:
         await query.edit_message_text("Нет активных договоров.")
@@ -1506,7 +1460,7 @@ async def violation_delete_select_flat(update, context):
 
     context.user_data["violation_delete_code"] = code
 
-    violations = fetch_contract_violations(code)
+    violations = await supabase.fetch_contract_violations(code)
 
     if not violations:
         await query.edit_message_text(
@@ -1540,7 +1494,7 @@ async def violation_delete_item(update, context):
 
     vid = query.data.split(":")[1]
 
-    delete_violation(vid)
+    await supabase.delete_violation(vid)
 
     await query.edit_message_text("✅ Нарушение удалено.")
 
@@ -1552,28 +1506,6 @@ async def violation_delete_item(update, context):
     return FlowState.MENU
 
 
-def generate_docs(data):
-
-    safe = data["CLIENT_NAME"].replace(" ", "_")
-    code = data.get("CONTRACT_CODE", "")
-
-    outputs = []
-
-    for tpl, prefix in [
-        (CONTRACT_TEMPLATE, "contract"),
-        (ACT_TEMPLATE, "act"),
-    ]:
-        doc = Document(tpl)
-        replace_everywhere(doc, data)
-        add_page_numbers(doc)
-
-        fname = f"{prefix}_{safe}_{code}.docx"
-
-        doc.save(fname)
-        outputs.append(fname)
-
-    return outputs
-
 # ===== Telegram flow =====
 
 async def start(update, context):
@@ -1674,24 +1606,50 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("\n".join(lines))
     return FlowState.FILLING
 
-async def stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# ======================================================
+# Precomputed reports (см. core/precompute.py)
+# ======================================================
 
-    if await access_guard(update):
-        return ConversationHandler.END
-    
-    query = update.callback_query
-    await query.answer()
+async def build_report_artefact(kind: str, inputs: tuple, builder, *args) -> dict:
+    """
+    Если отчёт из тех же данных уже загружался — берём его file_id
+    и ничего не строим.
+    """
 
-    try:
-        rows = fetch_all_contracts()
-    except Exception as e:
-        print("🔥 STATS ERROR:", repr(e))
-        await query.edit_message_text("⚠️ Ошибка получения данных.", reply_markup=None)
-        return FlowState.MENU
+    # json + sha256 по всем строкам — секунды CPU на больших таблицах;
+    # в воркере они не держат event loop (и GIL бота)
+    digest = await render_pool.run(content_key, kind, *inputs)
+
+    file_id = file_ids.get(digest)
+
+    if file_id:
+        return {"file_id": file_id, "digest": digest}
+
+    out = await render_pool.run(builder, *args)
+
+    return {"content": out.content, "filename": out.filename, "digest": digest}
+
+
+async def send_artefact(query, art):
+
+    # уже загруженный файл Telegram отдаёт по file_id без повторной загрузки
+    if art.file_id:
+        await query.message.reply_document(art.file_id)
+        return
+
+    msg = await query.message.reply_document(art.content, filename=art.filename)
+    art.file_id = msg.document.file_id
+
+    if art.digest:
+        file_ids.put(art.digest, art.file_id)
+
+
+async def build_stats_artefact() -> dict:
+
+    rows = await supabase.fetch_all_contracts()
 
     if not rows:
-        await query.edit_message_text("Пока нет договоров.", reply_markup=None)
-        return FlowState.MENU
+        return {"text": "Пока нет договоров."}
 
     # --------------------------------------
     # подтягиваем штрафы из violations
@@ -1703,7 +1661,7 @@ async def stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if r.get("contract_code")
     ]
 
-    penalties_map = fetch_penalties_by_contract_codes(codes)
+    penalties_map = await supabase.fetch_penalties_by_contract_codes(codes)
 
     for r in rows:
         r["penalties"] = penalties_map.get(
@@ -1711,14 +1669,46 @@ async def stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             0,
         )
 
-    # --------------------------------------
+    return await build_report_artefact(
+        "stats",
+        (rows,),
+        build_stats_excel,
+        rows,
+    )
+
+
+async def stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+    if await access_guard(update):
+        return ConversationHandler.END
+    
+    query = update.callback_query
+    await query.answer()
+
+    art = precomputed.get("stats")
+
+    if art is None:
+
+        await query.edit_message_text("📊 Формирую статистику…", reply_markup=None)
 
-    path = build_stats_excel(rows)
+        try:
+            art = await precomputed.refresh("stats")
+        except RenderTimeout:
+            await query.message.reply_text(
+                "⚠️ Отчёт формируется слишком долго, попробуйте позже.",
+                reply_markup=start_keyboard(update.effective_user),
+            )
+            return FlowState.MENU
+        except Exception as e:
+            log.error("stats_error", exc=e)
+            await query.message.reply_text("⚠️ Ошибка получения данных.")
+            return FlowState.MENU
 
-    await query.edit_message_text("📊 Формирую статистику…", reply_markup=None)
+    if art.text is not None:
+        await query.edit_message_text(art.text, reply_markup=None)
+        return FlowState.MENU
 
-    with open(path, "rb") as f:
-        await query.message.reply_document(f)
+    await send_artefact(query, art)
     
     await query.message.reply_text(
         "Главное меню:",
@@ -1746,6 +1736,34 @@ async def stats_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     return FlowState.MENU
 
+async def build_finance_artefact() -> dict:
+
+    today = date.today()
+
+    # полная сверка с базой раз в день; между ними леджер
+    # обновляется договорами, которые пишет сам бот
+    # договор, записанный пока идёт выборка, в неё мог не попасть —
+    # тогда выбираем заново
+    while finance_ledger.loaded_on != today:
+
+        seen = finance_ledger.applied
+        rows = await supabase.fetch_all_contracts()
+
+        if finance_ledger.applied == seen:
+            finance_ledger.load(rows, today)
+
+    # закрытые месяцы берутся из кэша леджера вместе с их хэшами —
+    # заново считается и хэшируется только то, что менялось
+    grouped = finance_ledger.snapshot(today)
+
+    return await build_report_artefact(
+        "finance",
+        (finance_ledger.digest(today),),
+        write_finance_report,
+        grouped,
+    )
+
+
 async def stats_finance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if await access_guard(update):
@@ -1754,14 +1772,22 @@ async def stats_finance_callback(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_all_contracts()
+    art = precomputed.get("finance")
+
+    if art is None:
 
-    await query.edit_message_text("💰 Формирую финансовый отчёт...")
+        await query.edit_message_text("💰 Формирую финансовый отчёт...")
 
-    path = build_finance_report(rows)
+        try:
+            art = await precomputed.refresh("finance")
+        except RenderTimeout:
+            await query.message.reply_text(
+                "⚠️ Отчёт формируется слишком долго, попробуйте позже.",
+                reply_markup=start_keyboard(update.effective_user),
+            )
+            return FlowState.MENU
 
-    with open(path, "rb") as f:
-        await query.message.reply_document(f)
+    await send_artefact(query, art)
 
     await query.message.reply_text(
         "Главное меню:",
@@ -1770,70 +1796,55 @@ async def stats_finance_callback(update: Update, context: ContextTypes.DEFAULT_T
 
     return FlowState.MENU
 
-async def active_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def flat_key(r):
+    try:
+        return int(r["flat_number"])
+    except Exception:
+        return r["flat_number"]
 
-    query = update.callback_query
-    await query.answer()
 
-    try:
-        rows = fetch_active_contracts()
-        def flat_key(r):
-            try:
-                return int(r["flat_number"])
-            except Exception:
-                return r["flat_number"]
-        
-        rows = sorted(rows, key=flat_key)
+async def build_active_artefact() -> dict:
 
-    except Exception:
-        await query.edit_message_text("⚠️ Ошибка получения данных.", reply_markup=None)
-        return FlowState.MENU
+    rows = sorted(await supabase.fetch_active_contracts(), key=flat_key)
 
     if not rows:
-        await query.edit_message_text("Сейчас жильцов нет.", reply_markup=None)
-        return FlowState.MENU
+        return {"text": "Сейчас жильцов нет."}
 
     lines = ["👥 Текущие жильцы:\n"]
 
     today = date.today()
 
+    previews = await supabase.calculate_close_previews(
+        rows,
+        actual_checkout_date=today,
+        early_checkout=True,
+        initiator="tenant",
+        manual_refund=None,
+    )
+
     for r in rows:
 
         try:
-            start = datetime.fromisoformat(r["start_date"]).date()
-            end = datetime.fromisoformat(r["end_date"]).date()
-        
+            preview = previews[r["contract_code"]]
+
             nights = int(r["nights"])
             price = int(r["price_per_day"])
-            total = int(r["total_price"])
-        
-            lived_nights = (today - start).days
-            lived_nights = max(0, min(lived_nights, nights))
-        
-            remaining_nights = nights - lived_nights
-        
+
+            # у активного договора прожито не больше оплаченного
+            lived_nights = min(preview.lived_nights, nights)
+            remaining_nights = preview.unused_nights
+
             earned = lived_nights * price
-        
-            preview = calculate_close_preview(
-                contract_code=r["contract_code"],
-                actual_checkout_date=today,
-                early_checkout=True,
-                initiator="tenant",
-                early_reason=None,
-                manual_refund=None,
-            )
-            
+
             deposit = int(r.get("deposit") or 0)
 
-            refund_today = preview["refund"] - deposit
-            refund_today = max(0, refund_today)
+            refund_today = max(0, preview.refund - deposit)
 
-            extra_due = preview["extra_due"]
-            penalties = preview["penalties"]
+            extra_due = preview.extra_due
+            penalties = preview.penalties
 
         except Exception as e:
-            print("🔥 ACTIVE ROW ERROR:", r)
-            print(e)
+            log.error("active_row_error", exc=e, contract_code=r.get("contract_code"))
             continue
     
         separator = "━━━━━━━━━━━━━━━━━━━━"
@@ -1855,7 +1866,21 @@ async def active_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"\n{separator}\n"
         )
 
-    await query.edit_message_text("\n".join(lines), reply_markup=None)
+    return {"text": "\n".join(lines)}
+
+
+async def active_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        art = await precomputed.get_or_build("active")
+    except Exception:
+        await query.edit_message_text("⚠️ Ошибка получения данных.", reply_markup=None)
+        return FlowState.MENU
+
+    await query.edit_message_text(art.text, reply_markup=None)
 
     await query.message.reply_text(
         "Главное меню:",
@@ -2075,7 +2100,15 @@ async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # ---------- ФИНАЛ: ГЕНЕРИРУЕМ ДОКУМЕНТЫ ----------
 
-    files = generate_docs(context.user_data)
+    try:
+        files = await render_pool.run(generate_docs, dict(context.user_data))
+    except RenderTimeout:
+        context.user_data["step"] = step - 1
+        await update.message.reply_text(
+            "⚠️ Документы формируются слишком долго. "
+            "Отправьте последнее значение ещё раз."
+        )
+        return FlowState.FILLING
 
     context.user_data["_generated_files"] = files
 
@@ -2159,11 +2192,21 @@ async def continue_after_payment(update, context):
 
     # если FIELDS закончились — финал
     if step >= len(FIELDS):
-        files = generate_docs(context.user_data)
-        context.user_data["_generated_files"] = files
 
         msg = update.effective_message
 
+        try:
+            files = await render_pool.run(generate_docs, dict(context.user_data))
+        except RenderTimeout:
+            context.user_data["step"] = step - 1
+            await msg.reply_text(
+                "⚠️ Документы формируются слишком долго. Попробуйте ещё раз.",
+                reply_markup=payment_method_keyboard(),
+            )
+            return FlowState.PAYMENT_METHOD
+
+        context.user_data["_generated_files"] = files
+
         await msg.reply_text(
             "📄 Документы готовы.\n\n"
             "Сохранить договор в базе данных?",
@@ -2196,7 +2239,7 @@ async def save_db_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_fixed_expenses()
+    rows = await supabase.fetch_fixed_expenses()
 
     fixed_sum = round(
         sum(float(r["total_price"]) for r in rows),
@@ -2205,14 +2248,13 @@ async def save_db_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     context.user_data["FIXED_PER_BOOKING"] = fixed_sum
 
-    save_contract_to_db(
+    await supabase.save_contract_to_db(
         context.user_data,
         context.user_data["_generated_files"],
     )
 
-    for fpath in context.user_data["_generated_files"]:
-        with open(fpath, "rb") as f:
-            await query.message.reply_document(f)
+    for out in context.user_data["_generated_files"]:
+        await query.message.reply_document(out.content, filename=out.filename)
 
     await query.edit_message_text("💾 Сохранено.", reply_markup=None)
     await query.message.reply_text(
@@ -2232,9 +2274,8 @@ async def skip_db_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    for fpath in context.user_data["_generated_files"]:
-        with open(fpath, "rb") as f:
-            await query.message.reply_document(f)
+    for out in context.user_data["_generated_files"]:
+        await query.message.reply_document(out.content, filename=out.filename)
 
     await query.edit_message_text("Не Сохранено.", reply_markup=None)
     await query.message.reply_text(
@@ -2254,7 +2295,7 @@ async def edit_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
 
-    rows = fetch_active_contracts()
+    rows = await supabase.fetch_active_contracts()
 
     buttons = []
 
@@ -2288,7 +2329,7 @@ async def edit_select_active(update, context):
 
     code = query.data.split(":")[1]
 
-    contract = get_contract_by_code(code)
+    contract = await supabase.get_contract_by_code(code)
 
     if not contract:
         await query.edit_message_text("❌ Договор не найден.")
@@ -2321,7 +2362,7 @@ async def edit_enter_code_handler(update: Update, context: ContextTypes.DEFAULT_
 
     code = update.message.text.strip()
 
-    contract = get_contract_by_code(code)
+    contract = await supabase.get_contract_by_code(code)
 
     if not contract:
         await update.message.reply_text("❌ Договор не найден. Попробуйте снова.")
@@ -2482,7 +2523,7 @@ async def close_show_preview(update, context):
 
     c = context.user_data["edit_contract"]
 
-    result = calculate_close_preview(
+    result = await supabase.calculate_close_preview(
         contract_code=c["contract_code"],
         actual_checkout_date=context.user_data["actual_end_date"],
         early_checkout=context.user_data.get("early_checkout", False),
@@ -2495,11 +2536,11 @@ async def close_show_preview(update, context):
 
     lines = [
         "📋 Предпросмотр закрытия:\n",
-        f"Прожито ночей: {result['lived_nights']}",
-        f"Непрожито → {result['unused']}€",
-        f"Штрафы: {result['penalties']}€",
-        f"Возврат: {result['refund']}€",
-        f"Долг клиента: {result['extra_due']}€",
+        f"Прожито ночей: {result.lived_nights}",
+        f"Непрожито → {result.unused}€",
+        f"Штрафы: {result.penalties}€",
+        f"Возврат: {result.refund}€",
+        f"Долг клиента: {result.extra_due}€",
         "",
         "Закрыть договор и сформировать акт?"
     ]
@@ -2625,37 +2666,50 @@ async def finalize_close(update, context):
         await update.message.reply_text("⚠️ Договор уже закрыт.")
         return FlowState.MENU
 
-    close_contract_full(
-        contract_code=c["contract_code"],
-        actual_checkout_date=context.user_data["actual_end_date"],
-        early_checkout=context.user_data.get("early_checkout"),
-        initiator=context.user_data.get("early_initiator"),
-        early_reason=context.user_data.get("early_reason"),
-        manual_refund=context.user_data.get("manual_refund"),
-    )
-
-    # читаем актуальный договор из БД
-    contract = get_contract_by_code(c["contract_code"])
+    try:
+        closed = await supabase.close_contract(
+            contract_code=c["contract_code"],
+            actual_checkout_date=context.user_data["actual_end_date"],
+            early_checkout=context.user_data.get("early_checkout"),
+            initiator=context.user_data.get("early_initiator"),
+            early_reason=context.user_data.get("early_reason"),
+            manual_refund=context.user_data.get("manual_refund"),
+        )
+    except ValueError as e:
+        # договор успел закрыть кто-то другой (или его удалили)
+        log.warning("close_error", error=str(e), contract_code=c["contract_code"])
+        await update.effective_message.reply_text(
+            "⚠️ Договор не найден." if "not found" in str(e) else "⚠️ Договор уже закрыт.",
+            reply_markup=start_keyboard(update.effective_user),
+        )
+        context.user_data.clear()
+        return FlowState.MENU
 
-    violations = fetch_contract_violations_for_period(
-        contract_code=contract["contract_code"],
-        start_date=contract["start_date"],
-        actual_end_date=contract["actual_checkout_date"],
-    )
+    # закрытый договор и нарушения за период приходят одним ответом
+    contract = closed["contract"]
+    violations = closed["violations"]
 
     safe_code = contract["contract_code"].replace("/", "_")
 
-    path = build_checkout_act(
-        template_path=CHECKOUT_ACT_TEMPLATE,
-        output_path=f"checkout_act_{safe_code}.docx",
-        contract=contract,
-        violations=violations,
-    )
-
     msg = update.effective_message
 
-    with open(path, "rb") as f:
-        await msg.reply_document(f)
+    try:
+        act = await render_pool.run(
+            build_checkout_act,
+            template_path=CHECKOUT_ACT_TEMPLATE,
+            filename=f"checkout_act_{safe_code}.docx",
+            contract=contract,
+            violations=violations,
+        )
+    except RenderTimeout:
+        await msg.reply_text(
+            "⚠️ Договор закрыт, но акт не успел сформироваться.",
+            reply_markup=start_keyboard(update.effective_user),
+        )
+        context.user_data.clear()
+        return FlowState.MENU
+
+    await msg.reply_document(act.content, filename=act.filename)
 
     await msg.reply_text(
         "✅ Договор закрыт и акт сформирован.",
@@ -2724,12 +2778,135 @@ def format_contract_view(c: dict) -> str:
     return "\n".join(x for x in lines if x)
 
 
+# ===== Profiling (/profile) =====
+
+async def profile_command(update, context):
+    """
+    /profile        — следующие PROFILE_UPDATES апдейтов
+    /profile 20     — следующие 20 апдейтов
+    /profile 60s    — следующие 60 секунд
+    /profile stop   — закончить сейчас
+
+    Работает в любом состоянии диалога и дальше не передаётся.
+    """
+
+    if await require_admin(update):
+        raise ApplicationHandlerStop
+
+    msg = update.effective_message
+    arg = (context.args or [""])[0].lower()
+
+    if arg == "stop":
+
+        if profiler.active:
+            await finish_profile(context)
+        else:
+            await msg.reply_text("ℹ️ Профилирование не запущено.")
+
+        raise ApplicationHandlerStop
+
+    if profiler.active:
+        await msg.reply_text("⚠️ Профилирование уже идёт. /profile stop — закончить.")
+        raise ApplicationHandlerStop
+
+    try:
+        if arg.endswith("s"):
+            updates, seconds = None, float(arg[:-1])
+        else:
+            updates, seconds = int(arg or PROFILE_UPDATES), None
+
+        # float() пропускает "nan" и "inf"
+        limit = updates if seconds is None else seconds
+
+        if not (math.isfinite(limit) and limit > 0):
+            raise ValueError(arg)
+
+    except ValueError:
+        await msg.reply_text("❌ Формат: /profile [N | Ns | stop]")
+        raise ApplicationHandlerStop
+
+    profiler.start(msg.chat_id, updates=updates, seconds=seconds)
+
+    # лимит по времени есть всегда (PROFILE_MAX_SECONDS)
+    if context.job_queue is not None:
+        context.job_queue.run_once(
+            profile_timeout_job,
+            when=profiler.session.deadline - time.monotonic(),
+            name="profile",
+        )
+
+    await msg.reply_text(
+        f"🔬 Профилирую следующие {updates} апдейтов…" if updates
+        else f"🔬 Профилирую {seconds:g} с…"
+    )
+
+    raise ApplicationHandlerStop
+
+
+async def profile_tick(update, context):
+
+    if profiler.tick():
+        await finish_profile(context)
+
+
+async def profile_timeout_job(context):
+
+    if profiler.active:
+        await finish_profile(context)
+
+
+async def finish_profile(context):
+
+    chat_id = profiler.session.chat_id
+
+    dump, report = profiler.stop()
+
+    if context.job_queue is not None:
+        for job in context.job_queue.get_jobs_by_name("profile"):
+            job.schedule_removal()
+
+    await context.bot.send_document(chat_id, report.content, filename=report.filename)
+    await context.bot.send_document(
+        chat_id,
+        dump.content,
+        filename=dump.filename,
+        caption="🔬 Профиль: cProfile (pstats) + tracemalloc",
+    )
+
+
 # ===== main =====
 
 WEBHOOK_PATH = "/webhook"
 PORT = int(os.environ.get("PORT", 10000))
 PUBLIC_URL = os.environ.get("PUBLIC_URL")  # будем задать в Render
 
+# другой адрес Bot API — локальный сервер или заглушка для нагрузочных
+# тестов (benchmarks/webhook_load.py)
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
+async def start_background_jobs(app):
+    precomputed.start(app.job_queue)
+
+
+def cache_counters():
+    return [
+        ("bot_db_cache_hits_total", {}, supabase.cache.hits),
+        ("bot_db_cache_misses_total", {}, supabase.cache.misses),
+        ("bot_db_requests_coalesced_total", {}, supabase.flights.shared),
+    ]
+
+
+def warm_render_pool():
+    # шаблоны и openpyxl грузятся в воркерах, пока бот уже отвечает
+    if RENDER_PREWARM:
+        render_pool.warm()
+
+
+async def close_db_client(app):
+    await supabase.aclose()
+    render_pool.shutdown()
+
+
 def main():
     port = int(os.environ.get("PORT", 10000))
     public_url = os.environ.get("PUBLIC_URL")
@@ -2739,9 +2916,56 @@ def main():
 
     webhook_url = public_url.rstrip("/") + WEBHOOK_PATH
 
-    print("🌍 Webhook URL:", webhook_url)
+    setup_logging()
+
+    # отчёты строятся в фоне и после записей, а не по нажатию кнопки
+    precomputed.register(
+        "active",
+        build_active_artefact,
+        triggers=("active_contracts", "contract:", "violations", "flat_violations"),
+    )
+    precomputed.register(
+        "stats",
+        build_stats_artefact,
+        triggers=("active_contracts", "contract:", "violations", "flat_violations"),
+    )
+    precomputed.register(
+        "finance",
+        build_finance_artefact,
+        triggers=("active_contracts", "contract:"),
+    )
+    precomputed.register(
+        "expenses",
+        build_expenses_artefact,
+        triggers=("expenses",),
+    )
+    supabase.cache.listeners.append(precomputed.on_invalidate)
+    supabase.contract_listeners.append(finance_ledger.apply)
+
+    # задержки / ошибки / объём ответов на GET /metrics
+    instrument_client(supabase)
 
-    app = ApplicationBuilder().token(TOKEN).build()
+    metrics.describe("bot_db_cache_hits_total", "counter", "Reads served from the query cache")
+    metrics.describe("bot_db_cache_misses_total", "counter", "Reads that went to Supabase")
+    metrics.describe("bot_db_requests_coalesced_total", "counter", "GETs that joined an identical request in flight")
+    metrics.collectors.append(cache_counters)
+
+    # незавершённые диалоги (user_data + состояние) переживают рестарт
+    persistence = SQLitePersistence(
+        store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+    )
+
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .base_url(TELEGRAM_API_URL + "/bot")
+        .base_file_url(TELEGRAM_API_URL + "/file/bot")
+        .updater(None)
+        .persistence(persistence)
+        .post_init(start_background_jobs)
+        .post_shutdown(close_db_client)
+        .build()
+    )
     
     conv = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -2956,23 +3180,36 @@ def main():
         },
         fallbacks=[CommandHandler("stop", stop)],
         allow_reentry=True,
+        name="main",
+        persistent=True,
     )
 
+    instrument_conversation(conv)
+
+    # /profile — до диалога; счётчик апдейтов — после него
+    app.add_handler(CommandHandler("profile", profile_command), group=-1)
     app.add_handler(conv)
+    app.add_handler(TypeHandler(Update, profile_tick), group=1)
+
+    async def error_handler(update, context):
+        log.error("handler_error", exc=context.error)
 
-    # 🚀 Самый стабильный запуск webhook
-    app.run_webhook(
+    app.add_error_handler(error_handler)
+
+    # свой tornado-сервер вместо run_webhook: рядом с /webhook отдаём
+    # /metrics (только если задан METRICS_TOKEN, см. core/webhook.py)
+    asyncio.run(serve_webhook(
+        app,
         listen="0.0.0.0",
         port=port,
         url_path=WEBHOOK_PATH,
         webhook_url=webhook_url,
-    )
-
-    async def error_handler(update, context):
-        print("🔥 ERROR:", context.error)
-    
-    app.add_error_handler(error_handler)
+        on_listening=warm_render_pool,
+    ))
 
+# воркеры RenderPool стартуют через spawn и импортируют этот файл заново
+# как __mp_main__: всё, что выше, выполняется в каждом воркере, поэтому
+# на уровне модуля — только дешёвые определения, запуск — здесь
 if __name__ == "__main__":
     main()
 
@@ -1,223 +1,258 @@
+from itertools import chain
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from datetime import datetime
-from core.constants import STAT_COLUMNS, STAT_HEADERS
 
+from core.output import render_to_bytes
 
-def build_stats_excel(rows):
 
-    # сортировка от новых к старым по дате заезда
-    rows = sorted(
-        rows,
-        key=lambda r: r.get("start_date") or "",
-        reverse=True,
-    )
+GRAY_BORDER = Border(
+    left=Side(style="thin", color="CCCCCC"),
+    right=Side(style="thin", color="CCCCCC"),
+    top=Side(style="thin", color="CCCCCC"),
+    bottom=Side(style="thin", color="CCCCCC"),
+)
+
+CENTER = Alignment(horizontal="center", vertical="center")
 
-    wb = Workbook()
+CELL_STYLE = "stats_cell"
+HEADER_STYLE = "stats_header"
 
-    gray_border = Border(
-        left=Side(style="thin", color="CCCCCC"),
-        right=Side(style="thin", color="CCCCCC"),
-        top=Side(style="thin", color="CCCCCC"),
-        bottom=Side(style="thin", color="CCCCCC"),
-    )
+# порядок в начале
+PREFERRED_KEYS = [
+    # --- Договор ---
+    "contract_code",
+    "flat_number",
 
-    center_align = Alignment(horizontal="center", vertical="center")
+    # --- Клиент ---
+    "client_name",
+    "client_id",
+    "client_number",
+    "client_mail",
+    "client_address",
 
-    # ====== СВОДКА ======
+    # --- Даты ---
+    "start_date",
+    "end_date",
+    "actual_checkout_date",
+    "checkout_time",
+    "nights",
 
-    ws1 = wb.active
-    ws1.title = "Сводка"
+    # --- Люди ---
+    "max_people_day",
+    "max_people_night",
 
-    total_income = sum(int(r.get("total_price") or 0) for r in rows)
-    total_nights = sum(int(r.get("nights") or 0) for r in rows)
+    # --- Оплата ---
+    "price_per_day",
+    "total_price",
+    "deposit",
 
-    first_date = min(
-        r.get("start_date") for r in rows
-        if r.get("start_date")
-    )
+    "payment_method",
+    "invoice_issued",
+    "invoice_number",
 
-    ws1.append(["Общий доход (€)", total_income])
-    ws1.append(["Всего ночей", total_nights])
-    ws1.append(["Дата первого договора", first_date])
+    # --- Статус ---
+    "is_closed",
+    "early_checkout",
+    "early_initiator",
+    "early_reason",
 
-    for row in ws1.iter_rows():
-        ws1.row_dimensions[row[0].row].height = 20
+    # --- Итоги ---
+    "refund_unused_amount",
+    "final_refund_amount",
+    "extra_due_amount",
+    "penalties",
+]
 
-        for cell in row:
-            cell.font = Font(bold=cell.column == 1)
-            cell.alignment = center_align
-            cell.border = gray_border
+# технические поля исключаем
+BANNED_KEYS = {"id", "created_at"}
 
-            ws1.column_dimensions[get_column_letter(cell.column)].width = 30
+HEADERS_MAP = {
+    "contract_code": "Код договора",
+    "flat_number": "Помещение",
 
-    # ====== ДОГОВОРЫ ======
+    "client_name": "Имя клиента",
+    "client_id": "Документ",
+    "client_address": "Адрес",
+    "client_mail": "Email",
+    "client_number": "Телефон",
 
-    ws2 = wb.create_sheet("Договоры")
+    "start_date": "Дата заезда",
+    "end_date": "Дата выезда",
+    "actual_checkout_date": "Фактический выезд",
 
-    if not rows:
-        return None
+    "nights": "Ночей",
+    "price_per_day": "Цена / ночь",
+    "total_price": "Общая сумма",
 
-    # порядок в начале
-    preferred = [
-        # --- Договор ---
-        "contract_code",
-        "flat_number",
-    
-        # --- Клиент ---
-        "client_name",
-        "client_id",
-        "client_number",
-        "client_mail",
-        "client_address",
-    
-        # --- Даты ---
-        "start_date",
-        "end_date",
-        "actual_checkout_date",
-        "checkout_time",
-        "nights",
-    
-        # --- Люди ---
-        "max_people_day",
-        "max_people_night",
-    
-        # --- Оплата ---
-        "price_per_day",
-        "total_price",
-        "deposit",
-    
-        "payment_method",
-        "invoice_issued",
-        "invoice_number",
-    
-        # --- Статус ---
-        "is_closed",
-        "early_checkout",
-        "early_initiator",
-        "early_reason",
-    
-        # --- Итоги ---
-        "refund_unused_amount",
-        "final_refund_amount",
-        "extra_due_amount",
-        "penalties",
-    ]
+    "deposit": "Депозит",
 
+    "payment_method": "Способ оплаты",
+    "invoice_issued": "Счёт выставлен",
+    "invoice_number": "Номер счёта",
 
-    # все реально пришедшие поля
-    all_keys = list(rows[0].keys())
+    "is_closed": "Статус договора",
 
-    # ❌ технические поля исключаем
-    banned = {"id", "created_at"}
+    "checkout_time": "Время выезда",
 
-    all_keys = [k for k in all_keys if k not in banned]
+    "max_people_day": "Макс. гостей днём",
+    "max_people_night": "Макс. гостей ночью",
 
-    # объединяем: сначала preferred, потом остальные
-    keys = preferred + [k for k in all_keys if k not in preferred]
+    "early_checkout": "Досрочный выезд",
+    "early_initiator": "Инициатор выезда",
+    "early_reason": "Причина выезда",
 
-    headers_map = {
-        "contract_code": "Код договора",
-        "flat_number": "Помещение",
+    "refund_unused_amount": "Возврат за непрожитые ночи",
+    "final_refund_amount": "Итоговый возврат",
+    "extra_due_amount": "Доплата клиента",
+    "penalties": "Штрафы (€)",
 
-        "client_name": "Имя клиента",
-        "client_id": "Документ",
-        "client_address": "Адрес",
-        "client_mail": "Email",
-        "client_number": "Телефон",
+}
 
-        "start_date": "Дата заезда",
-        "end_date": "Дата выезда",
-        "actual_checkout_date": "Фактический выезд",
 
-        "nights": "Ночей",
-        "price_per_day": "Цена / ночь",
-        "total_price": "Общая сумма",
+def humanize_value(key, val):
 
-        "deposit": "Депозит",
+    if key == "is_closed":
+        return "Завершён" if val else "Активен"
 
-        "payment_method": "Способ оплаты",
-        "invoice_issued": "Счёт выставлен",
-        "invoice_number": "Номер счёта",
+    if key == "payment_method":
+        return {
+            "cash": "Наличные",
+            "bank_transfer": "Банковский перевод",
+        }.get(val, "-")
 
-        "is_closed": "Статус договора",
+    if key == "invoice_issued":
+        return "Да" if val else "Нет"
 
-        "checkout_time": "Время выезда",
+    if key == "early_checkout":
+        return "Да" if val else "Нет"
 
-        "max_people_day": "Макс. гостей днём",
-        "max_people_night": "Макс. гостей ночью",
+    if key == "early_initiator":
+        return {
+            "tenant": "Клиент",
+            "landlord": "Арендодатель",
+        }.get(val, "-")
 
-        "early_checkout": "Досрочный выезд",
-        "early_initiator": "Инициатор выезда",
-        "early_reason": "Причина выезда",
+    return val
 
-        "refund_unused_amount": "Возврат за непрожитые ночи",
-        "final_refund_amount": "Итоговый возврат",
-        "extra_due_amount": "Доплата клиента",
-        "penalties": "Штрафы (€)",
 
-    }
+def build_stats_excel(rows):
+    """
+    rows: list or any iterable of contract dicts.
+
+    Lists are sorted here; iterators are written as they come, so they
+    should already be ordered by start_date desc (fetch order). One pass,
+    write-only worksheets, memory does not grow with the row count.
+    """
+
+    if isinstance(rows, list):
+        # сортировка от новых к старым по дате заезда
+        rows = sorted(
+            rows,
+            key=lambda r: r.get("start_date") or "",
+            reverse=True,
+        )
+
+    rows = iter(rows)
+    first = next(rows, None)
+
+    if first is None:
+        return None
 
-    # ---- Заголовки ----
+    wb = Workbook(write_only=True)
+    add_named_styles(wb)
 
-    ws2.append([headers_map.get(k, k) for k in keys])
-    # ---- Закрепляем верхнюю строку и первый столбец ----
-    ws2.freeze_panes = "B2"
-    ws2.auto_filter.ref = ws2.dimensions
+    ws1 = wb.create_sheet("Сводка")
+    ws2 = wb.create_sheet("Договоры")
 
-    for col in range(1, len(keys) + 1):
+    # ====== ДОГОВОРЫ ======
 
-        cell = ws2.cell(row=1, column=col)
+    # все реально пришедшие поля
+    all_keys = [k for k in first.keys() if k not in BANNED_KEYS]
 
-        cell.font = Font(bold=True)
-        cell.alignment = center_align
-        cell.border = gray_border
+    # объединяем: сначала preferred, потом остальные
+    keys = PREFERRED_KEYS + [k for k in all_keys if k not in PREFERRED_KEYS]
+
+    # ---- Закрепляем верхнюю строку и первый столбец ----
+    ws2.freeze_panes = "B2"
 
+    for col in range(1, len(keys) + 1):
         ws2.column_dimensions[get_column_letter(col)].width = 26
 
     ws2.row_dimensions[1].height = 26
+    ws2.sheet_format.defaultRowHeight = 18
+    ws2.sheet_format.customHeight = True
+
+    # ---- Заголовки ----
+
+    ws2.append([styled(ws2, HEADERS_MAP.get(k, k), HEADER_STYLE) for k in keys])
 
     # ---- Данные ----
 
-    def humanize_value(key, val):
+    total_income = 0
+    total_nights = 0
+    first_date = None
+    count = 0
+
+    for r in chain([first], rows):
+
+        ws2.append([styled(ws2, humanize_value(k, r.get(k))) for k in keys])
+
+        total_income += int(r.get("total_price") or 0)
+        total_nights += int(r.get("nights") or 0)
+
+        start = r.get("start_date")
+        if start and (first_date is None or start < first_date):
+            first_date = start
+
+        count += 1
+
+    ws2.auto_filter.ref = f"A1:{get_column_letter(len(keys))}{count + 1}"
+
+    # ====== СВОДКА ======
 
-        if key == "is_closed":
-            return "Завершён" if val else "Активен"
+    ws1.column_dimensions["A"].width = 30
+    ws1.column_dimensions["B"].width = 30
+    ws1.sheet_format.defaultRowHeight = 20
+    ws1.sheet_format.customHeight = True
 
-        if key == "payment_method":
-            return {
-                "cash": "Наличные",
-                "bank_transfer": "Банковский перевод",
-            }.get(val, "-")
+    for label, value in [
+        ("Общий доход (€)", total_income),
+        ("Всего ночей", total_nights),
+        ("Дата первого договора", first_date),
+    ]:
+        ws1.append([
+            styled(ws1, label, HEADER_STYLE),
+            styled(ws1, value),
+        ])
 
-        if key == "invoice_issued":
-            return "Да" if val else "Нет"
+    return render_to_bytes(wb.save, "contracts_stats.xlsx")
 
-        if key == "early_checkout":
-            return "Да" if val else "Нет"
 
-        if key == "early_initiator":
-            return {
-                "tenant": "Клиент",
-                "landlord": "Арендодатель",
-            }.get(val, "-")
+# --------------------------------------------------
 
 
-        return val
+def add_named_styles(wb):
 
-    for r in rows:
-        ws2.append([humanize_value(k, r.get(k)) for k in keys])
+    wb.add_named_style(NamedStyle(
+        name=CELL_STYLE,
+        border=GRAY_BORDER,
+        alignment=CENTER,
+    ))
 
-    for row in ws2.iter_rows(min_row=2):
+    wb.add_named_style(NamedStyle(
+        name=HEADER_STYLE,
+        font=Font(bold=True),
+        border=GRAY_BORDER,
+        alignment=CENTER,
+    ))
 
-        ws2.row_dimensions[row[0].row].height = 18
 
-        for cell in row:
-            cell.alignment = center_align
-            cell.border = gray_border
+def styled(ws, value, style=CELL_STYLE):
 
-    path = "/tmp/contracts_stats.xlsx"
-    wb.save(path)
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
 
-    return path
+    return cell
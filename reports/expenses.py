@@ -4,6 +4,8 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 
+from core.output import render_to_bytes
+
 
 def build_expenses_report(rows):
 
@@ -131,7 +133,4 @@ def build_expenses_report(rows):
     for col in range(1, 5):
         ws.column_dimensions[get_column_letter(col)].width = 30
 
-    path = "/tmp/expenses_report.xlsx"
-    wb.save(path)
-
-    return path
+    return render_to_bytes(wb.save, "expenses_report.xlsx")
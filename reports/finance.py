@@ -1,10 +1,12 @@
-from datetime import date, datetime
-from collections import defaultdict
+from datetime import date
 
 from openpyxl import Workbook
 from openpyxl.styles import Alignment, Border, Side, Font
 from openpyxl.utils import get_column_letter
 
+from core.output import render_to_bytes
+from reports.finance_ledger import aggregate_finance
+
 
 GRAY_BORDER = Border(
     left=Side(style="thin", color="CCCCCC"),
@@ -30,21 +32,18 @@ def month_range(year: int, month: int):
     return start, end
 
 
-def overlap_nights(a_start, a_end, b_start, b_end):
-    start = max(a_start, b_start)
-    end = min(a_end, b_end)
-
-    if start >= end:
-        return 0
+# -------------------------------------------------------
 
-    return (end - start).days
 
+def build_finance_report(rows):
+    return write_finance_report(aggregate_finance(rows))
 
-# -------------------------------------------------------
 
+def write_finance_report(grouped: dict):
+    """
+    grouped: {(year, month): {flat: bucket}} from FinanceLedger.snapshot.
+    """
 
-def build_finance_report(rows):
-    
     wb = Workbook()
     ws = wb.active
     ws.title = "Финансы"
@@ -78,85 +77,6 @@ def build_finance_report(rows):
 
     ws.row_dimensions[1].height = 26
 
-    # --------------------------------------------------
-    # группировка: (year, month) -> flat -> data
-    # --------------------------------------------------
-
-    grouped = defaultdict(lambda: defaultdict(lambda: {
-        "nights": 0,
-        "realized": 0,
-        "unrealized": 0,
-        "potential": 0,
-        "expenses": 0,
-        "price_seen": set(),
-    }))
-
-    today = date.today()
-
-    for r in rows:
-
-        try:
-            start = datetime.fromisoformat(r["start_date"]).date()
-        
-            actual_raw = r.get("actual_checkout_date")
-        
-            if actual_raw:
-                end = datetime.fromisoformat(actual_raw).date()
-            else:
-                end = datetime.fromisoformat(r["end_date"]).date()
-        
-            price = int(r["price_per_day"])
-            flat = r["flat_number"]
-            fixed = float(r.get("fixed_per_booking") or 0)
-
-        except Exception:
-            continue
-
-        cur = start.replace(day=1)
-
-        while cur < end:
-
-            m_start, m_end = month_range(cur.year, cur.month)
-            days_in_month = (m_end - m_start).days
-
-            nights = overlap_nights(start, end, m_start, m_end)
-
-            if nights:
-
-                bucket = grouped[(cur.year, cur.month)][flat]
-
-                bucket["nights"] += nights
-
-                # ---- реализовано ----
-                lived = overlap_nights(
-                    start,
-                    min(today, end),
-                    m_start,
-                    m_end,
-                )
-
-                realized = lived * price
-                bucket["realized"] += realized
-
-                # ---- нереализовано внутри договора ----
-                unrealized = (nights - lived) * price
-                bucket["unrealized"] += unrealized
-
-                # ---- потенциал квартиры за месяц ----
-                # берем максимум по тарифу, если в месяце были разные договоры
-                bucket["price_seen"].add(price)
-                bucket["potential"] = days_in_month * max(bucket["price_seen"])
-
-                # ---- расходы ТОЛЬКО в месяце заезда ----
-                if cur.year == start.year and cur.month == start.month:
-                    bucket["expenses"] += fixed
-
-            # следующий месяц
-            if cur.month == 12:
-                cur = date(cur.year + 1, 1, 1)
-            else:
-                cur = date(cur.year, cur.month + 1, 1)
-
     # --------------------------------------------------
     # вывод
     # --------------------------------------------------
@@ -271,6 +191,4 @@ def build_finance_report(rows):
                 cell.alignment = CENTER
                 cell.border = GRAY_BORDER
 
-    path = "/tmp/financial_report.xlsx"
-    wb.save(path)
-    return path
+    return render_to_bytes(wb.save, "financial_report.xlsx")
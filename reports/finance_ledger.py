@@ -0,0 +1,276 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from core.file_cache import content_key
+
+
+# ======================================================
+# Incremental (month, flat) finance ledger
+# ======================================================
+
+def next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def parse_contract(r):
+    """
+    (start, end, price, flat, fixed) of a contract row, `end` being the
+    actual checkout when there is one; None if the row can't be parsed.
+    """
+
+    try:
+        start = datetime.fromisoformat(r["start_date"]).date()
+
+        actual_raw = r.get("actual_checkout_date")
+
+        if actual_raw:
+            end = datetime.fromisoformat(actual_raw).date()
+        else:
+            end = datetime.fromisoformat(r["end_date"]).date()
+
+        price = int(r["price_per_day"])
+        flat = r["flat_number"]
+        fix = float(r.get("fixed_per_booking") or 0)
+
+    except Exception:
+        return None
+
+    return start, end, price, flat, fix
+
+
+class Bucket:
+    """
+    Running totals of one (month, flat). `stays` keeps each contract's
+    slice of the month (lo, hi, price, expenses, is check-in month) so
+    it can be taken out again and so the current month can be split
+    into realized / unrealized against today.
+    """
+
+    __slots__ = ("flat", "nights", "value", "expenses", "check_ins", "prices", "stays")
+
+    def __init__(self, flat):
+        self.flat = flat
+        self.nights = 0
+        self.value = 0
+        self.expenses = 0.0
+        self.check_ins = 0
+        self.prices = Counter()
+        self.stays = {}
+
+
+class FinanceLedger:
+    """
+    The finance report's (month, flat) aggregates, kept per contract.
+
+    apply(row) replaces one contract's contribution, so a new or closed
+    contract costs O(its months) instead of a full recompute. Months
+    before the current one are fully realized, later ones fully
+    unrealized; only the current month is split against today when a
+    snapshot is taken.
+
+    snapshot() returns {(year, month): {flat: bucket}} where bucket has
+    nights, realized, unrealized, potential and expenses, as
+    write_finance_report expects. The rows and the hash of every month
+    are kept until a contract touching it changes: a refresh with no
+    writes only rebuilds the current month, once a day. The returned
+    rows are shared with that cache and must not be modified.
+    """
+
+    def __init__(self):
+        self._months = {}       # (year, month) -> {str(flat): Bucket}
+        self._contracts = {}    # contract key -> [(year, month, str(flat))]
+
+        # (year, month) -> (stamp, rows, digest), see _month()
+        self._snapshots = {}
+
+        self.loaded_on = None
+
+        # bumped by every apply(); lets a loader notice writes that
+        # landed while it was fetching rows
+        self.applied = 0
+
+    def load(self, rows, today: date | None = None):
+        """
+        Full rebuild from every contract row.
+        """
+
+        self._months.clear()
+        self._contracts.clear()
+        self._snapshots.clear()
+
+        for row in rows:
+            self.apply(row)
+
+        self.loaded_on = today or date.today()
+
+    # --------------------------------------------------
+
+    def apply(self, row: dict):
+        """
+        Adds a contract, or replaces what it contributed before.
+        """
+
+        key = row.get("id") or row.get("contract_code") or object()
+
+        self.applied += 1
+        self.remove(key)
+
+        parsed = parse_contract(row)
+
+        if parsed is None:
+            return
+
+        start, end, price, flat, fixed = parsed
+
+        if end <= start:
+            return
+
+        keys = []
+        month = start.replace(day=1)
+
+        while month < end:
+
+            lo = max(start, month)
+            hi = min(end, next_month(month))
+
+            ym = (month.year, month.month)
+            bucket_key = (*ym, str(flat))
+
+            flats = self._months.setdefault(ym, {})
+            bucket = flats.get(str(flat))
+
+            if bucket is None:
+                bucket = flats[str(flat)] = Bucket(flat)
+
+            self._snapshots.pop(ym, None)
+
+            # расходы только в месяце заезда
+            check_in = lo == start
+            expenses = fixed if check_in else 0.0
+
+            nights = (hi - lo).days
+
+            bucket.nights += nights
+            bucket.value += nights * price
+            bucket.expenses += expenses
+            bucket.check_ins += check_in
+            bucket.prices[price] += 1
+            bucket.stays[key] = (lo, hi, price, expenses, check_in)
+
+            keys.append(bucket_key)
+            month = next_month(month)
+
+        self._contracts[key] = keys
+
+    def remove(self, key):
+
+        for year, month, flat in self._contracts.pop(key, ()):
+
+            flats = self._months[(year, month)]
+            bucket = flats[flat]
+            lo, hi, price, expenses, check_in = bucket.stays.pop(key)
+
+            self._snapshots.pop((year, month), None)
+
+            nights = (hi - lo).days
+
+            bucket.nights -= nights
+            bucket.value -= nights * price
+            bucket.expenses -= expenses
+            bucket.check_ins -= check_in
+            bucket.prices[price] -= 1
+
+            if not bucket.prices[price]:
+                del bucket.prices[price]
+
+            if not bucket.stays:
+                del flats[flat]
+
+            if not flats:
+                del self._months[(year, month)]
+
+    # --------------------------------------------------
+
+    def snapshot(self, today: date | None = None) -> dict:
+
+        today = today or date.today()
+
+        return {ym: self._month(ym, today)[0] for ym in self._months}
+
+    def digest(self, today: date | None = None) -> str:
+        """
+        Hash of snapshot(today), combined from the per-month hashes.
+        """
+
+        today = today or date.today()
+
+        return content_key(
+            "finance",
+            [(ym, self._month(ym, today)[1]) for ym in sorted(self._months)],
+        )
+
+    def _month(self, ym: tuple, today: date) -> tuple:
+        """
+        (rows, digest) of one month. Past and future months don't
+        depend on today; the current one is valid for a single day.
+        """
+
+        current = (today.year, today.month)
+        stamp = today if ym == current else ym < current
+
+        cached = self._snapshots.get(ym)
+
+        if cached is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+
+        year, month = ym
+
+        month_start = date(year, month, 1)
+        days_in_month = (next_month(month_start) - month_start).days
+
+        rows = {}
+
+        for b in self._months[ym].values():
+
+            if ym < current:
+                realized = b.value
+            elif ym > current:
+                realized = 0
+            else:
+                realized = sum(
+                    max(0, (min(hi, today) - lo).days) * price
+                    for lo, hi, price, _, _ in b.stays.values()
+                )
+
+            rows[b.flat] = {
+                "nights": b.nights,
+                "realized": realized,
+                "unrealized": b.value - realized,
+                # без заездов в этом месяце расходы остаются int 0
+                "expenses": round(b.expenses, 2) if b.check_ins else 0,
+                "potential": days_in_month * max(b.prices),
+            }
+
+        digest = content_key(
+            "finance-month",
+            ym,
+            sorted((str(flat), row) for flat, row in rows.items()),
+        )
+
+        self._snapshots[ym] = (stamp, rows, digest)
+
+        return rows, digest
+
+
+def aggregate_finance(rows, today: date | None = None) -> dict:
+    """
+    One-off snapshot of `rows` without touching the shared ledger.
+    """
+
+    ledger = FinanceLedger()
+    ledger.load(rows, today)
+
+    return ledger.snapshot(today)
+
+
+finance_ledger = FinanceLedger()